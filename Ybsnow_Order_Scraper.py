@@ -5,14 +5,27 @@ YBSNow Order Scraper — CLI + GUI (customtkinter)
 Features
 - Logs into https://www.ybsnow.com/ using the email/password fields described.
 - Navigates to a provided, authenticated Orders page URL and extracts the Orders table.
-- Saves results to CSV, XLSX, and a user-selected SQLite database and shows a preview in a simple GUI.
+- Saves results to CSV, XLSX, a user-selected SQLite database, Parquet and/or JSON Lines (--formats)
+  and shows a preview in a simple GUI.
 - CLI for automation; GUI for convenience.
 
 Dependencies
   pip install requests beautifulsoup4 lxml pandas openpyxl python-dotenv customtkinter
 
-Optional (only if you later enable the Selenium fallback):
-  pip install selenium webdriver-manager
+Optional (only for --render selenium, JS-driven Orders pages; needs Chrome/Chromium installed):
+  pip install selenium
+
+Optional (only for --engine async):
+  pip install httpx
+
+Optional (only for --formats parquet):
+  pip install pyarrow
+
+Optional (lets the server send Brotli-compressed pages):
+  pip install brotli
+
+Optional (only for YAML --batch manifests; JSON and TOML need nothing extra):
+  pip install pyyaml
 
 Security
 - Credentials are accepted via CLI flags, GUI fields, or environment variables.
@@ -23,68 +36,2570 @@ Security
       YBSNOW_ORDERS_URL="https://www.ybsnow.com/some/orders/page"
 
 Notes
-- This script uses requests + BeautifulSoup/Pandas to parse HTML tables. If the Orders page is heavily JS-driven,
-  uncomment and use the Selenium fallback provided near the bottom (disabled by default to keep things simple).
+- This script uses requests + lxml/Pandas to parse HTML tables. If the Orders page is heavily JS-driven,
+  pass --render selenium: pages whose static HTML has no orders table are re-rendered in a headless browser.
 - The login flow is based on the form snippet you shared: POST to /index.php with fields email, password, action=signin.
-- Adjust SELECTORS in parse_orders_table(...) if the target table has a known id/class.
+- Adjust ORDERS_TABLE_SELECTORS if the target table has a known id/class.
 """
 
 from __future__ import annotations
 import argparse
+import functools
+import hashlib
+import importlib
+import inspect
+import json
 import os
+import re
 import sys
+import threading
 import time
-from dataclasses import dataclass
-from typing import Optional, List, Tuple
-
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from dotenv import load_dotenv
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from io import StringIO
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, Optional, List, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
 
+# Heavy dependencies (pandas, requests, bs4, lxml, dotenv, asyncio, sqlite3, openpyxl) are
+# imported on the code paths that use them, so --help and argument errors start instantly.
 # GUI imports (lazy-loaded inside main to allow headless CLI usage)
 # import customtkinter as ctk
 
-DEFAULT_BASE_URL = "https://www.ybsnow.com/"
-LOGIN_PATH = "index.php"           # from your form action
-DEFAULT_LOGIN_URL = DEFAULT_BASE_URL + LOGIN_PATH
 
-USER_AGENT = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/124.0.0.0 Safari/537.36"
-)
+class _LazyModule:
+    """Module stand-in bound to a global name; the first attribute access imports the real
+    module and rebinds the global to it, so later lookups cost nothing extra."""
+
+    def __init__(self, name: str, alias: str):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+if TYPE_CHECKING:
+    import asyncio
+    from http.cookiejar import CookieJar
+    import pandas as pd
+else:
+    asyncio = _LazyModule("asyncio", "asyncio")
+    pd = _LazyModule("pandas", "pd")
+
+DEFAULT_BASE_URL = "https://www.ybsnow.com/"
+LOGIN_PATH = "index.php"           # from your form action
+DEFAULT_LOGIN_URL = DEFAULT_BASE_URL + LOGIN_PATH
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+# Known orders-table selectors, best match first (adjust to your DOM).
+# "class" matches a single class token or the full attribute string, like BeautifulSoup.
+ORDERS_TABLE_SELECTORS = [
+    {"name": "table", "attrs": {"id": "orders"}},
+    {"name": "table", "attrs": {"class": "orders"}},
+    {"name": "table", "attrs": {"class": "table table-striped"}},
+]
+
+# Output writers selectable with --formats; selected ones run concurrently.
+OUTPUT_FORMATS = ("csv", "xlsx", "sqlite", "parquet", "jsonl")
+
+# Column names that mark the orders table when no selector matches.
+PREFERRED_COLUMNS = [
+    "Order", "Order #", "Order ID", "PO", "Customer", "Workstation", "Status", "Date", "Due"
+]
+# Column names that mark the line-items table on an order's detail page.
+ITEM_COLUMNS = [
+    "Item", "SKU", "Part", "Product", "Description", "Qty", "Quantity", "Unit Price", "Price", "Amount",
+]
+# Added to the orders table with --details: absolute URL of each row's detail page.
+DETAIL_URL_COLUMN = "Detail URL"
+# Natural-key candidates for incremental SQLite upserts, best first.
+ORDER_KEY_COLUMNS = ["Order #", "Order ID", "Order No", "Order Number", "Order", "PO"]
+
+@dataclass
+class ScrapeConfig:
+    base_url: str
+    login_url: str
+    orders_url: str
+    email: str
+    password: str
+    out_csv: str = "orders.csv"
+    out_xlsx: str = "orders.xlsx"
+    out_db: str = "orders.db"
+    out_parquet: str = "orders.parquet"
+    out_jsonl: str = "orders.jsonl"
+    formats: Tuple[str, ...] = ("csv", "xlsx", "sqlite")  # subset of OUTPUT_FORMATS to write
+    parquet_compression: str = "zstd"
+    typed_columns: bool = True  # parse dates/numbers/money and use categoricals in _clean_df
+    string_storage: str = "auto"  # pandas string storage: "auto", "pyarrow" or "python"
+    watch_interval: float = 0.0 # seconds between polls in --watch mode (0 = single run)
+    watch_jitter: float = 0.1   # +/- fraction of the interval randomised per poll
+    watch_count: int = 0        # stop after this many polls (0 = run until stopped)
+    change_state_file: str = "" # persist validators/table hash here to skip unchanged pages ("" disables)
+    selector_cache_file: str = ""  # learned fallback-table locations per orders URL ("" disables)
+    metrics_file: str = ""      # append stage timings as JSON lines, or a Prometheus textfile if *.prom ("" disables)
+    json_discovery: bool = False  # load orders from JSON behind the Orders page when it has any
+    details: bool = False       # crawl each row's detail page into the order_items SQLite table
+    detail_workers: int = 4     # concurrent detail page fetches
+    detail_rate: float = 2.0    # max detail requests per second per host (0 = unlimited)
+    renderer: str = ""          # RENDERERS entry used when static HTML has no orders table ("" disables)
+    render_pool: int = 1        # warm headless browsers kept by the renderer
+    render_timeout: float = 20.0  # seconds to wait for a rendered table
+    connect_timeout: float = 10.0  # seconds to establish a connection
+    read_timeout: float = 30.0  # seconds to wait for response data
+    http_retries: int = 3       # retries per GET on connection errors, timeouts and RETRY_STATUSES
+    backoff_base: float = 0.5   # first retry delay; doubles on each further retry
+    backoff_max: float = 30.0   # cap on a single backoff delay (Retry-After is honoured as sent)
+    backoff_jitter: float = 0.5 # up to this many random seconds added to each delay
+    pool_connections: int = 10  # per-host connection pools kept by the HTTP adapter
+    pool_maxsize: int = 0       # keep-alive connections per host (0 = max(10, page_workers))
+    stream: bool = True         # single-page runs: parse the Orders page while it downloads
+    stream_chunk_size: int = 1 << 16  # bytes per read when streaming
+    stream_batch_rows: int = 10000  # rows parsed, cleaned and written per batch when streaming to the outputs
+    all_pages: bool = False     # follow pagination links and merge every page
+    page_workers: int = 4       # concurrent page fetches
+    page_retries: int = 2       # extra attempts per page on transient errors
+    max_pages: int = 500        # safety cap on pages fetched per run
+    engine: str = "sync"        # "sync" (requests) or "async" (httpx)
+    async_concurrency: int = 8  # in-flight requests / pooled connections for the async engine
+    parse_processes: int = 0    # >0: async engine parses in a process pool instead of threads
+    session_cache_dir: str = "" # reuse cookies from this dir across runs ("" disables)
+    db_mode: str = "replace"    # "replace" rewrites the orders table; "upsert" merges by key
+    db_key: str = ""            # natural key column for upserts/history ("" = auto-detect)
+    history: bool = False       # append changed rows to orders_history (CDC)
+    source_column: str = ""     # batch runs: column naming each row's target; SQLite rows are replaced/keyed per source
+    batch_manifest: str = ""    # YAML/JSON/TOML file of targets to scrape in one run ("" = single target)
+    batch_workers: int = 4      # targets scraped concurrently in batch mode
+    batch_per_host: int = 2     # cap on concurrent targets against the same host
+    batch_processes: bool = False  # run batch targets in worker processes instead of threads
+
+    @property
+    def timeouts(self) -> Tuple[float, float]:
+        """(connect, read) timeout pair as requests expects it."""
+        return (self.connect_timeout, self.read_timeout)
+
+
+# ------------------------ Table extraction --------------------------
+
+_CELL_WS_RE = re.compile(r"[\r\n]+|\s{2,}")  # same whitespace collapsing as pandas.read_html
+# Cell texts read_html's parser treats as missing (pandas' default na_values) and as booleans.
+_HTML_NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+_HTML_BOOLS = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+
+
+def _selector_rank(tag: str, attrib) -> Optional[int]:
+    """Index of the first ORDERS_TABLE_SELECTORS entry matching this start tag, if any."""
+    for rank, sel in enumerate(ORDERS_TABLE_SELECTORS):
+        if tag != sel["name"]:
+            continue
+        for key, want in sel["attrs"].items():
+            have = attrib.get(key)
+            if have is None:
+                break
+            if key == "class":
+                if have.strip() != want and want not in have.split():
+                    break
+            elif have != want:
+                break
+        else:
+            return rank
+    return None
+
+
+class _OrdersTableTarget:
+    """lxml parser target that captures the best-ranked selector table while the page streams past.
+
+    Body rows go straight into per-column lists; nothing else in the document is kept.
+    Cells are read the way read_html reads them: <br> is a space, na_values are missing,
+    and <tfoot> rows come after the body rows.
+    """
+
+    def __init__(self) -> None:
+        self.best_rank: Optional[int] = None
+        self.done = False            # set once the top-ranked selector has been fully read
+        self.unsupported = False     # rowspan / multi-row header: leave it to pandas.read_html
+        self.login_form = False      # saw the sign-in form (same test as _looks_like_login_page)
+        self.header: Optional[List[str]] = None
+        self.columns: List[List[Optional[str]]] = []
+        self.links: List[Optional[str]] = []  # first <a href> of each body row
+        self.nrows = 0
+        self._capturing = False
+        self._nested = 0             # depth of tables nested inside the captured one
+        self._in_thead = False
+        self._in_tfoot = False
+        self._footer: List[Tuple[List[str], Optional[str]]] = []  # tfoot rows, added when the table ends
+        self._row: Optional[List[str]] = None
+        self._row_all_th = True
+        self._row_link: Optional[str] = None
+        self._cell: Optional[List[str]] = None
+        self._colspan = 1
+
+    def start(self, tag, attrib) -> None:
+        if tag == "form" and attrib.get("name") == "signin" and attrib.get("id") == "signin":
+            self.login_form = True
+        if not self._capturing:
+            if tag == "table":
+                rank = _selector_rank(tag, attrib)
+                if rank is not None and (self.best_rank is None or rank < self.best_rank):
+                    self._begin(rank)
+            return
+        if tag == "table":
+            self._nested += 1
+        elif self._nested:
+            return
+        elif tag == "tr":
+            self._row = []
+            self._row_all_th = True
+            self._row_link = None
+        elif tag == "a":
+            if self._row is not None and self._row_link is None:
+                self._row_link = attrib.get("href")
+        elif tag == "br":
+            if self._cell is not None:
+                self._cell.append("\n")
+        elif tag in ("td", "th"):
+            self._cell = []
+            self._row_all_th = self._row_all_th and tag == "th"
+            try:
+                self._colspan = max(1, int(attrib.get("colspan", 1)))
+            except ValueError:
+                self._colspan = 1
+            if attrib.get("rowspan", "1").strip() not in ("", "1"):
+                self.unsupported = True
+        elif tag == "thead":
+            self._in_thead = True
+        elif tag in ("tbody", "tfoot"):
+            self._in_thead = False
+            self._in_tfoot = tag == "tfoot"
+
+    def end(self, tag) -> None:
+        if not self._capturing:
+            return
+        if tag == "table":
+            if self._nested:
+                self._nested -= 1
+                return
+            for row, link in self._footer:
+                self._row_all_th = False
+                self._row_link = link
+                self._end_row(row)
+            self._footer = []
+            self._capturing = False
+            self.done = self.best_rank == 0
+        elif self._nested:
+            return
+        elif tag in ("td", "th") and self._cell is not None:
+            text = _CELL_WS_RE.sub(" ", "".join(self._cell)).strip()
+            if self._row is not None:
+                self._row.extend([text] * self._colspan)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._in_tfoot:
+                self._footer.append((self._row, self._row_link))
+            else:
+                self._end_row(self._row)
+            self._row = None
+        elif tag == "thead":
+            self._in_thead = False
+        elif tag == "tfoot":
+            self._in_tfoot = False
+
+    def data(self, data: str) -> None:
+        if self._capturing and self._cell is not None:
+            self._cell.append(data)
+
+    def close(self) -> None:
+        return None
+
+    def _begin(self, rank: int) -> None:
+        # A better-ranked table later in the page replaces anything captured so far.
+        login_form = self.login_form
+        self.__init__()
+        self.login_form = login_form
+        self.best_rank = rank
+        self._capturing = True
+
+    def _end_row(self, row: List[str]) -> None:
+        if not row:
+            return
+        if self._in_thead or (self._row_all_th and self.nrows == 0):
+            if self.header is not None:
+                self.unsupported = True
+            self.header = row
+            return
+        for _ in range(len(self.columns), len(row)):
+            self.columns.append([None] * len(self.links))
+        for i, col in enumerate(self.columns):
+            value = row[i] if i < len(row) else None
+            col.append(None if value in _HTML_NA_VALUES else value)
+        self.links.append(self._row_link)
+        self.nrows += 1
+
+    def clear_rows(self) -> None:
+        """Drop the body rows collected so far (OrdersTableExtractor.iter_frames hands them out)."""
+        self.columns = [[] for _ in self.columns]
+        self.links = []
+
+
+class StreamFallback(Exception):
+    """The orders table can't be streamed batch by batch; ``page``, when set, is the whole
+    OrdersPage for parse_orders_table."""
+
+    def __init__(self, reason: str, page: Optional["OrdersPage"] = None):
+        super().__init__(reason)
+        self.page = page
+
+
+class OrdersTableExtractor:
+    """Single-pass orders-table extractor built on lxml's HTMLParser target interface.
+
+    Replaces the BeautifulSoup parse -> str(table) -> pandas.read_html round trip with one
+    streaming pass. ``extract`` returns None when no selector table matched (``matched`` is
+    False) or when the table needs read_html's full rowspan/header handling.
+    """
+
+    def __init__(self, chunk_size: int = 1 << 16):
+        self.chunk_size = chunk_size
+        self.matched = False
+        self.login_form = False
+        self.links: List[Optional[str]] = []  # first link of each body row, as in the page
+
+    def extract(self, html: Union[str, bytes]) -> Optional[pd.DataFrame]:
+        return self.extract_chunks(html[i:i + self.chunk_size] for i in range(0, len(html), self.chunk_size))
+
+    def extract_chunks(self, chunks: Iterable[Union[str, bytes]], encoding: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Incremental form of extract: feed chunks (e.g. a streamed response body) as they arrive.
+
+        Byte chunks are decoded with ``encoding``; libxml2 would otherwise guess. Stops
+        consuming ``chunks`` once the top-ranked selector table has been read. Also sets
+        ``login_form`` if the sign-in form went past.
+        """
+        from lxml import etree
+
+        target = _OrdersTableTarget()
+        parser = etree.HTMLParser(target=target, encoding=encoding)
+        fed = False
+        for chunk in chunks:
+            if not chunk:
+                continue
+            parser.feed(chunk)
+            fed = True
+            if target.done:
+                break
+        else:
+            if fed:
+                parser.close()
+        self.login_form = target.login_form
+        self.matched = target.best_rank is not None
+        self.links = target.links
+        if not self.matched or target.unsupported:
+            return None
+        return self._to_frame(target)
+
+    def iter_frames(
+        self, chunks: Iterable[Union[str, bytes]], encoding: Optional[str] = None, batch_rows: int = 10000,
+    ) -> Iterator[pd.DataFrame]:
+        """extract_chunks in batches: yield the matched table ``batch_rows`` rows at a time.
+
+        Once the top-ranked selector table is being read (nothing later can replace it),
+        rows are handed out while the page is still arriving; a lower-ranked match is held
+        until the page ends. Raises StreamFallback when no selector table matched, it has
+        no rows, or it needs read_html (rowspans, a second header row, rows wider than the
+        header). ``login_form`` and ``matched`` are set before it raises.
+        """
+        from lxml import etree
+
+        target = _OrdersTableTarget()
+        parser = etree.HTMLParser(target=target, encoding=encoding)
+
+        def take() -> pd.DataFrame:
+            df = None if target.unsupported else self._to_frame(target)
+            if df is None:
+                raise StreamFallback("orders table needs read_html (rowspans or irregular header)")
+            target.clear_rows()
+            return df
+
+        emitted = fed = False
+        for chunk in chunks:
+            if not chunk:
+                continue
+            parser.feed(chunk)
+            fed = True
+            if target.best_rank == 0 and len(target.links) >= batch_rows:
+                emitted = True
+                yield take()
+            if target.done:
+                break
+        else:
+            if fed:
+                parser.close()
+        self.login_form = target.login_form
+        self.matched = target.best_rank is not None
+        if not self.matched:
+            raise StreamFallback("no known orders table selector matched")
+        if target.links or target.unsupported:
+            yield take()
+        elif not emitted:
+            raise StreamFallback("orders table has no rows")
+
+    @staticmethod
+    def _to_frame(target: _OrdersTableTarget) -> Optional[pd.DataFrame]:
+        width = len(target.columns)
+        if target.header is not None:
+            if width and len(target.header) != width:
+                return None
+            # Mirror read_html's naming of blank and duplicate headers
+            names: List = []
+            seen: dict = {}
+            for i, name in enumerate(target.header):
+                name = name or f"Unnamed: {i}"
+                if name in seen:
+                    seen[name] += 1
+                    name = f"{name}.{seen[name]}"
+                else:
+                    seen[name] = 0
+                names.append(name)
+            if not width:
+                return pd.DataFrame(columns=names)
+        else:
+            names = list(range(width))
+        data = {}
+        for i, col in enumerate(target.columns):
+            s = pd.Series(col)
+            try:
+                # Same numeric inference as read_html (thousands=","); all-missing is float NaN
+                s = pd.to_numeric(s.str.replace(",", "", regex=False))
+            except AttributeError:
+                s = s.astype("float64")
+            except (ValueError, TypeError):
+                first = next((v for v in col if v is not None), None)
+                if first in _HTML_BOOLS and set(s.dropna().unique()) <= _HTML_BOOLS.keys():
+                    s = s.map(_HTML_BOOLS).astype(object if s.hasnans else bool)
+            data[i] = s
+        df = pd.DataFrame(data)
+        df.columns = names
+        return df
+
+
+class OrdersPage(str):
+    """A fetched Orders page: the HTML text itself, plus one lazily built lxml tree.
+
+    Being a str keeps every caller that expected fetch_orders_html's raw HTML working
+    (hashing, read_html, saving). The auth check, selector lookup, pagination scan and
+    table extraction all read ``tree``, so the page is parsed at most once however many
+    of them run. Pickles as plain text (the tree is rebuilt on the other side).
+    """
+
+    def __new__(cls, html: str, url: str = ""):
+        page = super().__new__(cls, html)
+        page.url = url
+        page.table = None  # element parse_orders_table read the orders from
+        page._tree = None
+        return page
+
+    def __reduce__(self):
+        return (OrdersPage, (str(self), self.url))
+
+    @classmethod
+    def of(cls, html: str) -> "OrdersPage":
+        return html if isinstance(html, OrdersPage) else cls(html)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            from lxml import etree
+            import lxml.html
+
+            try:
+                self._tree = lxml.html.document_fromstring(self)
+            except ValueError:  # str with an XML encoding declaration
+                parser = lxml.html.HTMLParser(encoding="utf-8")
+                self._tree = lxml.html.document_fromstring(self.encode("utf-8"), parser=parser)
+            except etree.ParserError:  # empty document
+                self._tree = lxml.html.document_fromstring("<html></html>")
+        return self._tree
+
+    @property
+    def login_form(self) -> bool:
+        """True if the page has <form name="signin" id="signin">; pages never mentioning
+        "signin" are answered without parsing."""
+        if "signin" not in self:
+            return False
+        return bool(self.tree.xpath('//form[@name="signin" and @id="signin"]'))
+
+    def has_orders_table(self) -> bool:
+        """A selector table, or any table that scores above zero, is present."""
+        if self.selector_table() is not None:
+            return True
+        return any((score_table(t) or 0) > 0 for t in self.tree.iter("table"))
+
+    def selector_table(self):
+        """The best-ranked ORDERS_TABLE_SELECTORS table element, or None."""
+        best = None
+        best_rank: Optional[int] = None
+        for table in self.tree.iter("table"):
+            rank = _selector_rank("table", table.attrib)
+            if rank is None or (best_rank is not None and rank >= best_rank):
+                continue
+            if best is not None and best in table.iterancestors("table"):
+                continue  # same as the streaming extractor: nested tables never replace their parent
+            best, best_rank = table, rank
+            if rank == 0:
+                break
+        return best
+
+    def extract_table(self) -> Optional[pd.DataFrame]:
+        """Selector table as a DataFrame, walked from the cached tree.
+
+        Same rules as OrdersTableExtractor: None when no selector matched or the table
+        needs read_html (rowspan, multi-row header).
+        """
+        from lxml import etree
+
+        table = self.selector_table()
+        if table is None:
+            return None
+        self.table = table
+        target = _OrdersTableTarget()
+        for event, el in etree.iterwalk(table, events=("start", "end")):
+            if event == "start":
+                if isinstance(el.tag, str):
+                    target.start(el.tag, el.attrib)
+                    if el.text:
+                        target.data(el.text)
+                continue
+            if isinstance(el.tag, str):
+                target.end(el.tag)
+            if el is not table and el.tail:
+                target.data(el.tail)
+        if target.unsupported:
+            return None
+        return OrdersTableExtractor._to_frame(target)
+
+    def table_html(self, table) -> str:
+        import lxml.html
+
+        return lxml.html.tostring(table, encoding="unicode", with_tail=False)
+
+
+# -------------------------- Table scoring ---------------------------
+
+# Any PREFERRED_COLUMNS name inside a (lowercased) header, longest first.
+_PREFERRED_RE = re.compile(
+    "|".join(re.escape(c) for c in sorted({c.lower() for c in PREFERRED_COLUMNS}, key=len, reverse=True))
+)
+# Cell contents typical of an orders table: order/PO numbers and dates.
+_ORDER_NO_RE = re.compile(r"(?:#|no\.?|po|so|ord(?:er)?)?[\s#:-]*[a-z]{0,3}-?\d{4,}", re.I)
+_DATE_RE = re.compile(
+    r"(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|[a-z]{3,9}\.? \d{1,2},? \d{4}|\d{1,2} [a-z]{3,9}\.? \d{4})"
+    r"(?:[ T]\d{1,2}:\d{2}(?::\d{2})?(?: ?[ap]m)?)?",
+    re.I,
+)
+_SCORE_SAMPLE_ROWS = 25   # body rows sampled per table for cell signals
+_SCORE_MIN_MATCH = 0.8    # share of sampled cells a column needs to count as an order-number/date column
+
+
+def _row_texts(tr) -> List[str]:
+    texts: List[str] = []
+    for cell in tr.iterchildren("td", "th"):
+        try:
+            span = max(1, int(cell.get("colspan", 1)))
+        except ValueError:
+            span = 1
+        texts.extend([" ".join(cell.text_content().split())] * span)
+    return texts
+
+
+def table_sample(table, limit: int = _SCORE_SAMPLE_ROWS) -> Tuple[List[str], List[List[str]]]:
+    """(header texts, first ``limit`` body rows' texts) of a <table> element."""
+    header: List[str] = []
+    body: List[List[str]] = []
+    for tr in table.xpath("./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr"):
+        texts = _row_texts(tr)
+        if not texts:
+            continue
+        if not body and (tr.getparent().tag == "thead" or all(c.tag == "th" for c in tr.iterchildren("td", "th"))):
+            header = texts
+            continue
+        body.append(texts)
+        if len(body) >= limit:
+            break
+    return header, body
+
+
+def score_table(table) -> Optional[int]:
+    """Relevance of one <table> element as the orders table, or None if it is not data-like.
+
+    Read straight from the tree, never via read_html, and only the header plus the first
+    _SCORE_SAMPLE_ROWS body rows are looked at, so the cost per table is bounded however
+    big it is. Tables read_html would return with fewer than two columns or no body rows
+    get None, as before.
+    """
+    return score_rows(*table_sample(table))
+
+
+def score_rows(header: List[str], body: List[List[str]]) -> Optional[int]:
+    """Orders-table relevance of a header plus sampled body rows (cell texts).
+
+    One point per header naming a PREFERRED_COLUMNS field, plus one each for a column of
+    order numbers and a column of dates. None if fewer than two columns or no rows.
+    """
+    width = max([len(header)] + [len(r) for r in body])
+    if width < 2 or not body:
+        return None
+    score = sum(1 for h in header if _PREFERRED_RE.search(h.lower()))
+    columns = [[r[i] for r in body if i < len(r) and r[i]] for i in range(width)]
+    for pattern in (_ORDER_NO_RE, _DATE_RE):
+        if any(col and sum(1 for v in col if pattern.fullmatch(v)) >= _SCORE_MIN_MATCH * len(col) for col in columns):
+            score += 1
+    return score
+
+
+def pick_orders_table(page: OrdersPage):
+    """Highest-scoring table on the page (first one wins ties), or None if none is data-like."""
+    best = None
+    best_score = -1
+    for table in page.tree.iter("table"):
+        score = score_table(table)
+        if score is not None and score > best_score:
+            best, best_score = table, score
+    return best
+
+
+# --------------------------- Pagination -----------------------------
+
+# Query parameters that carry a 1-based page number on paginated listings.
+PAGE_PARAMS = ("page", "p", "pg", "pageno", "page_no", "pagenum", "paged")
+_NEXT_TEXTS = {"next", "next »", "next ›", "»", "›", ">", ">>"}
+
+
+def _set_query_param(url: str, key: str, value) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != key]
+    query.append((key, str(value)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def discover_page_links(html: str, page_url: str) -> Tuple[Optional[str], dict, Optional[str]]:
+    """Scan a listing page for pagination links.
+
+    Returns (page_param, {page_number: url}, next_url). page_param is the query parameter
+    most often used by numbered links; next_url is a rel="next"/"Next" link, if any.
+    An OrdersPage is scanned from its cached tree.
+    """
+    doc = OrdersPage.of(html).tree
+    by_param: dict = {}
+    next_url = None
+    for a in doc.iterfind(".//a[@href]"):
+        href = a.get("href", "").strip()
+        if not href or href.startswith(("#", "javascript:")):
+            continue
+        url = urljoin(page_url, href)
+        text = " ".join(a.text_content().split()).lower()
+        if next_url is None and ("next" in (a.get("rel") or "").lower().split() or text in _NEXT_TEXTS):
+            next_url = url
+        for key, value in parse_qsl(urlsplit(url).query):
+            if key.lower() in PAGE_PARAMS and value.isdigit():
+                by_param.setdefault(key, {})[int(value)] = url
+    if not by_param:
+        return None, {}, next_url
+    param = max(by_param, key=lambda k: len(by_param[k]))
+    return param, by_param[param], next_url
+
+
+# -------------------------- JSON discovery --------------------------
+
+# JS assignments whose right-hand side may be a JSON literal: `var orders = [...]`, `window.__STATE__ = {...}`.
+_JS_ASSIGN_RE = re.compile(r"(?:^|[;\s(])[\w$.\[\]'\"]+\s*=\s*(?=[\[{])")
+# URLs read with GET by fetch / XHR / jQuery / DataTables: fetch("..."), $.getJSON('...'), $.get("..."),
+# xhr.open("GET", "..."), url: "...", ajax: "...". Calls and option objects that name another
+# method (_NON_GET_RE) are dropped; $.post and .load are never collected.
+_AJAX_URL_RE = re.compile(
+    r"""(?:\b(?:fetch|getJSON|get|ajax)\s*\(\s*|\bopen\s*\(\s*["']GET["']\s*,\s*"""
+    r"""|\b(?:url|ajax|source|endpoint|dataUrl)\s*:\s*)["']([^"'\s<>]+)["']""",
+    re.I,
+)
+_NON_GET_RE = re.compile(r"""\b(?:method|type)\s*:\s*["'](?!get["'])\w+["']""", re.I)
+# data-* attributes that name an endpoint rather than carry a payload. Not read from
+# links, buttons and forms, whose data-url is usually the action a click performs.
+_DATA_URL_ATTRS = {"data-url", "data-src", "data-source", "data-ajax", "data-ajax-url", "data-endpoint", "data-api"}
+_ACTION_TAGS = {"a", "button", "form", "input"}
+# Endpoints never requested however they were found: they end the session or change data.
+_UNSAFE_URL_RE = re.compile(r"(?:log|sign)[-_]?(?:out|off)|delete|remove|destroy|cancel", re.I)
+# Keys giving a JSON listing's page count / next page link.
+_JSON_PAGE_COUNT_KEYS = ("last_page", "total_pages", "totalPages", "pageCount", "page_count", "pages")
+_JSON_NEXT_KEYS = ("next", "next_page_url", "nextPage", "next_url")
+JSON_MAX_ENDPOINTS = 10  # endpoint candidates tried per page
+JSON_REQUEST_HEADERS = {"Accept": "application/json, text/javascript, */*; q=0.01", "X-Requested-With": "XMLHttpRequest"}
+
+
+def _json_or_none(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def discover_json_sources(page: OrdersPage, page_url: str) -> Tuple[list, List[str]]:
+    """Look through an Orders page for order data that does not need the HTML table.
+
+    Returns (inline payloads, endpoint URLs): JSON from <script type="application/json">,
+    JSON literals assigned in inline scripts and JSON-valued data-* attributes; plus the
+    URLs scripts read with GET through fetch/XHR/jQuery/DataTables and data-url style
+    attributes. Only endpoints on the page's own host are returned, so the session cookies
+    never leave the site, and never ones whose URL looks like logout/delete/cancel
+    (_UNSAFE_URL_RE): they are fetched over the logged-in session.
+    """
+    tree = page.tree
+    payloads: list = []
+    urls: List[str] = []
+    for script in tree.iter("script"):
+        text = script.text or ""
+        if not text.strip() or script.get("src"):
+            continue
+        kind = (script.get("type") or "").lower()
+        if "json" in kind:
+            data = _json_or_none(text)
+            if data is not None:
+                payloads.append(data)
+            continue
+        decoder = json.JSONDecoder()
+        for m in _JS_ASSIGN_RE.finditer(text):
+            try:
+                payloads.append(decoder.raw_decode(text, m.end())[0])
+            except ValueError:
+                pass  # a JS object literal, not JSON
+        urls.extend(m.group(1) for m in _AJAX_URL_RE.finditer(text) if _read_with_get(text, m))
+    for value in tree.xpath("//@*[starts-with(name(), 'data-')]"):
+        value_s = str(value).strip()
+        if value_s[:1] in ("[", "{"):
+            data = _json_or_none(value_s)
+            if data is not None:
+                payloads.append(data)
+        elif value.attrname.lower() in _DATA_URL_ATTRS and value_s and value.getparent().tag not in _ACTION_TAGS:
+            urls.append(value_s)
+    host = urlsplit(page_url).netloc.lower()
+    endpoints: List[str] = []
+    for url in urls:
+        if url.startswith(("#", "javascript:", "data:")):
+            continue
+        url = urljoin(page_url, url)
+        parts = urlsplit(url)
+        if parts.netloc.lower() != host or url in endpoints or _same_page(url, page_url):
+            continue
+        if _UNSAFE_URL_RE.search(f"{parts.path}?{parts.query}"):
+            continue
+        endpoints.append(url)
+    return payloads, endpoints[:JSON_MAX_ENDPOINTS]
+
+
+def _read_with_get(text: str, m: "re.Match") -> bool:
+    """Whether the _AJAX_URL_RE hit m is read with GET: the statement around it (up to 400
+    characters each side, cut at ";") names no other method, as in fetch(url, {method:
+    "POST"}) or $.ajax({url: ..., type: "POST"}). Erring towards dropping a candidate."""
+    lo = max(text.rfind(";", 0, m.start()) + 1, m.start() - 400)
+    hi = text.find(";", m.end())
+    hi = min(hi if hi != -1 else len(text), m.end() + 400)
+    return not _NON_GET_RE.search(text, lo, hi)
+
+
+def _record_lists(data, depth: int = 0):
+    """Yield (rows, enclosing dict or None) for every list of objects/arrays in data."""
+    if depth > 4:
+        return
+    if isinstance(data, list):
+        if data and (all(isinstance(r, dict) for r in data) or all(isinstance(r, list) for r in data)):
+            yield data, None
+    elif isinstance(data, dict):
+        for value in data.values():
+            for rows, parent in _record_lists(value, depth + 1):
+                yield rows, parent if parent is not None else data
+
+
+def _column_names(parent: Optional[dict], width: int) -> Optional[List[str]]:
+    """Names for array-of-array rows from a sibling "columns"/"headers" list (DataTables style)."""
+    if not parent:
+        return None
+    for key in ("columns", "headers", "fields", "cols"):
+        cols = parent.get(key)
+        if isinstance(cols, list) and len(cols) == width:
+            names = [c.get("title") or c.get("name") or c.get("data") if isinstance(c, dict) else c for c in cols]
+            if all(isinstance(n, str) and n for n in names):
+                return names
+    return None
+
+
+def _scalar(value):
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+
+def json_records_frame(data, header: Optional[List[str]] = None) -> Tuple[Optional[pd.DataFrame], int]:
+    """Best list of records in a JSON document as a DataFrame, with its score_rows score.
+
+    Lists of objects are flattened with pandas.json_normalize ("customer.name" columns);
+    lists of arrays take their names from a sibling "columns" list, else from ``header``
+    (the page's orders table header) when the widths agree. Nested values that are still
+    lists/objects become JSON text. Returns (None, -1) if nothing record-like is found.
+    """
+    best: Optional[pd.DataFrame] = None
+    best_key = (-1, 0)
+    for rows, parent in _record_lists(data):
+        if isinstance(rows[0], dict):
+            df = pd.json_normalize(rows)
+        else:
+            width = max(len(r) for r in rows)
+            names = _column_names(parent, width) or (header if header and len(header) == width else None)
+            df = pd.DataFrame([list(r) + [None] * (width - len(r)) for r in rows], columns=names)
+        sample = [
+            ["" if v is None else str(_scalar(v)) for v in row]
+            for row in df.head(_SCORE_SAMPLE_ROWS).itertuples(index=False, name=None)
+        ]
+        score = score_rows([str(c) for c in df.columns], sample)
+        if score is None:
+            continue
+        if (score, len(df)) > best_key:
+            best, best_key = df, (score, len(df))
+    if best is None:
+        return None, -1
+    for col in best.columns:
+        if best[col].dtype == object:
+            best[col] = best[col].map(_scalar)
+    return best, best_key[0]
+
+
+def json_pagination(data, url: str) -> Tuple[Optional[str], int, Optional[str]]:
+    """(page query parameter, page count, next URL) advertised by a JSON listing, if any."""
+    if not isinstance(data, dict):
+        return None, 0, None
+    meta = [data] + [v for k, v in data.items() if k in ("meta", "pagination", "paging", "links") and isinstance(v, dict)]
+    count = 0
+    next_url = None
+    for d in meta:
+        for key in _JSON_PAGE_COUNT_KEYS:
+            if isinstance(d.get(key), int) and not isinstance(d.get(key), bool):
+                count = max(count, d[key])
+        for key in _JSON_NEXT_KEYS:
+            if next_url is None and isinstance(d.get(key), str) and d[key]:
+                next_url = urljoin(url, d[key])
+    params = [k for k, _ in parse_qsl(urlsplit(url).query) if k.lower() in PAGE_PARAMS]
+    return (params[0] if params else "page"), count, next_url
+
+
+# -------------------------- Session cache ---------------------------
+
+DEFAULT_SESSION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ybsnow", "sessions")
+
+_COOKIE_FIELDS = (
+    "version", "name", "value", "port", "port_specified", "domain", "domain_specified",
+    "domain_initial_dot", "path", "path_specified", "secure", "expires", "discard",
+    "comment", "comment_url", "rfc2109",
+)
+
+
+class SessionCache:
+    """On-disk cookie jar cache, one JSON file per (base URL, email).
+
+    Files are written atomically with 0600 permissions inside a 0700 directory; the
+    password is never stored. Works on any http.cookiejar.CookieJar, so both the
+    requests and httpx engines can share it.
+    """
+
+    def __init__(self, cache_dir: str, base_url: str, email: str):
+        key = hashlib.sha256(f"{base_url.rstrip('/')}\0{email.lower()}".encode()).hexdigest()[:32]
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"{key}.json")
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, jar: CookieJar) -> bool:
+        """Populate jar from disk; False if there is nothing usable cached."""
+        from http.cookiejar import Cookie  # pulls in urllib.request; only needed here
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return False
+        loaded = 0
+        for entry in entries:
+            try:
+                cookie = Cookie(**{k: entry.get(k) for k in _COOKIE_FIELDS}, rest=entry.get("rest") or {})
+            except TypeError:
+                continue
+            if not cookie.is_expired():
+                jar.set_cookie(cookie)
+                loaded += 1
+        return loaded > 0
+
+    def save(self, jar: CookieJar) -> None:
+        entries = []
+        for c in jar:
+            entry = {k: getattr(c, k) for k in _COOKIE_FIELDS}
+            entry["rest"] = getattr(c, "_rest", {})
+            entries.append(entry)
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        # A temp name of its own: batch targets on one account save to the same path at once.
+        _, tmp = _temp_path(self.path)
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------------- SQLite -------------------------------
+
+def detect_order_key(columns) -> Optional[str]:
+    """Pick the natural key column using the same column-name heuristics as table scoring.
+
+    ORDER_KEY_COLUMNS are tried in priority order, exact (case-insensitive) names first,
+    then as substrings, so "Order #" wins over "Order Date".
+    """
+    names = [str(c) for c in columns]
+    lowered = [n.strip().lower() for n in names]
+    for cand in ORDER_KEY_COLUMNS:
+        if cand.lower() in lowered:
+            return names[lowered.index(cand.lower())]
+    for cand in ORDER_KEY_COLUMNS:
+        for name, low in zip(names, lowered):
+            if cand.lower() in low and not any(w in low for w in ("date", "due", "status")):
+                return name
+    return None
+
+
+def _qi(name: str) -> str:
+    """Quote an SQLite identifier."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sqlite_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def _sqlite_rows(df: pd.DataFrame):
+    """Rows as plain Python tuples with missing values as None (dates as to_sql's text form)."""
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+_PLAIN_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def _cell_text(value) -> str:
+    """One cell as read_html would type it on its own (thousands=","), written as text."""
+    if isinstance(value, str):
+        if value in _HTML_BOOLS:
+            return str(_HTML_BOOLS[value])
+        plain = value.replace(",", "")
+        if not _PLAIN_NUMBER_RE.fullmatch(plain):
+            return value
+        value = float(plain)
+    if pd.api.types.is_bool(value):
+        return str(bool(value))
+    if pd.api.types.is_number(value):
+        value = float(value)
+        return str(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+    return str(value)
+
+
+def scraped_text(df: pd.DataFrame) -> pd.DataFrame:
+    """df with every present cell as canonical text, whatever its column's dtype.
+
+    read_html (and the extractor) type a column from all of its cells, so the same cell
+    is 1001 on one page and "1001" on the next when a neighbour reads "TBD". Rows stored
+    or hashed in this form compare equal across runs unless their own cells changed.
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col].astype(object)
+        out[col] = s.where(s.notna(), None).map(_cell_text, na_action="ignore")
+    return pd.DataFrame(out, index=df.index)
+
+
+def _key_columns(key: Union[str, List[str]]) -> List[str]:
+    return [key] if isinstance(key, str) else list(key)
+
+
+def _ensure_orders_table(conn, df: pd.DataFrame, table: str) -> None:
+    """Create table from df's columns/dtypes, or ALTER in any columns it is missing."""
+    existing = [r[1] for r in conn.execute(f"PRAGMA table_info({_qi(table)})")]
+    if not existing:
+        col_defs = ", ".join(f"{_qi(c)} {_sqlite_type(df[c].dtype)}" for c in df.columns)
+        conn.execute(f"CREATE TABLE {_qi(table)} ({col_defs})")
+        return
+    for c in df.columns:
+        if str(c) not in existing:
+            conn.execute(f"ALTER TABLE {_qi(table)} ADD COLUMN {_qi(c)} {_sqlite_type(df[c].dtype)}")
+
+
+def upsert_orders(conn, df: pd.DataFrame, key: Union[str, List[str]], table: str = "orders") -> dict:
+    """Merge df into table keyed on ``key`` with INSERT ... ON CONFLICT, in one transaction.
+
+    ``key`` is a column name or a list of them (batch runs key on source + order). New
+    columns are added with ALTER TABLE, a unique index backs the key, and rows whose
+    values are identical to the stored ones are not rewritten. Returns
+    {"inserted", "updated", "unchanged"} counts.
+    """
+    keys = _key_columns(key)
+    for k in keys:
+        if k not in df.columns:
+            raise ValueError(f"Upsert key column {k!r} not found in Orders table.")
+    df = df.dropna(subset=keys).drop_duplicates(subset=keys, keep="last")
+    cols = [str(c) for c in df.columns]
+    key_list = ", ".join(_qi(k) for k in keys)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")  # sqlite3 would otherwise autocommit the DDL below
+        _ensure_orders_table(conn, df, table)
+        conn.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {_qi(f'ux_{table}_' + '_'.join(keys))} ON {_qi(table)} ({key_list})"
+        )
+
+        conn.execute("DROP TABLE IF EXISTS temp._orders_stage")
+        conn.execute(f"CREATE TEMP TABLE _orders_stage ({', '.join(_qi(c) for c in cols)})")
+        conn.executemany(
+            f"INSERT INTO _orders_stage VALUES ({', '.join('?' for _ in cols)})", _sqlite_rows(df)
+        )
+        match = " AND ".join(f"t.{_qi(k)} = s.{_qi(k)}" for k in keys)
+        inserted = conn.execute(
+            f"SELECT COUNT(*) FROM _orders_stage s WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {_qi(table)} t WHERE {match})"
+        ).fetchone()[0]
+
+        col_list = ", ".join(_qi(c) for c in cols)
+        others = [c for c in cols if c not in keys]
+        before = conn.total_changes
+        if others:
+            sets = ", ".join(f"{_qi(c)} = excluded.{_qi(c)}" for c in others)
+            changed = " OR ".join(f"{_qi(table)}.{_qi(c)} IS NOT excluded.{_qi(c)}" for c in others)
+            conflict = f"DO UPDATE SET {sets} WHERE {changed}"
+        else:
+            conflict = "DO NOTHING"
+        conn.execute(
+            f"INSERT INTO {_qi(table)} ({col_list}) SELECT {col_list} FROM _orders_stage WHERE true "
+            f"ON CONFLICT({key_list}) {conflict}"
+        )
+        written = conn.total_changes - before
+        conn.execute("DROP TABLE temp._orders_stage")
+
+    return {
+        "inserted": inserted,
+        "updated": written - inserted,
+        "unchanged": len(df) - written,
+    }
+
+
+def check_source_rows(conn, source_column: str, table: str = "orders") -> None:
+    """Raise ValueError if table holds rows with no source_column value.
+
+    Those come from single-target runs (before the table had the column). Batch writes
+    replace or key rows per source, so they would never be replaced or cleaned up; the
+    caller has to label them (see the readme) or use a separate database.
+    """
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({_qi(table)})")]
+    if not cols:
+        return
+    where = f" WHERE {_qi(source_column)} IS NULL" if source_column in cols else ""
+    legacy = conn.execute(f"SELECT COUNT(*) FROM {_qi(table)}{where}").fetchone()[0]
+    if legacy:
+        raise ValueError(
+            f"{legacy} rows in table {table!r} have no {source_column!r} (written by a single-target run); "
+            f"set {source_column} on them or use a separate --db-file for batch runs."
+        )
+
+
+def replace_source_rows(conn, df: pd.DataFrame, source_column: str, table: str = "orders") -> dict:
+    """Replace, per source, the rows of table that came from each source present in df.
+
+    Used by batch runs that merge several accounts/views into one table: each source's old
+    rows are deleted and its new rows inserted in a single transaction, so sources that
+    failed this run (absent from df) keep their previous rows. Raises ValueError (see
+    check_source_rows) if the table has rows without a source. Returns {source: rows}.
+    """
+    cols = [str(c) for c in df.columns]
+    insert = (
+        f"INSERT INTO {_qi(table)} ({', '.join(_qi(c) for c in cols)}) "
+        f"VALUES ({', '.join('?' for _ in cols)})"
+    )
+    counts = {}
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        check_source_rows(conn, source_column, table)
+        _ensure_orders_table(conn, df, table)
+        for source, part in df.groupby(source_column, sort=False, observed=True):
+            conn.execute(f"DELETE FROM {_qi(table)} WHERE {_qi(source_column)} = ?", (source,))
+            conn.executemany(insert, _sqlite_rows(part))
+            counts[source] = len(part)
+    return counts
+
+
+def _utc_stamp(when: Optional[datetime] = None) -> str:
+    """Fixed-width UTC ISO-8601 stamp; compares correctly as text in SQLite."""
+    when = when or datetime.now(timezone.utc)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def record_order_history(
+    conn, df: pd.DataFrame, key: Union[str, List[str]], scraped_at: Optional[datetime] = None
+) -> dict:
+    """Change-data capture: append new/changed rows to orders_history.
+
+    Each row is serialized to canonical JSON and hashed; hashes are compared against
+    orders_snapshot (one row per order key, primary-key lookup) and only rows whose hash
+    differs are appended to orders_history with the scrape timestamp. A composite key is
+    stored as a JSON array of its values (source labels may themselves contain "/");
+    snapshot/history rows keyed the older "/"-joined way are rewritten to it on the way
+    through. History is indexed on scraped_at so "what changed since T" stays a range
+    scan. Returns {"new", "changed", "unchanged"} counts.
+    """
+    keys = _key_columns(key)
+    for k in keys:
+        if k not in df.columns:
+            raise ValueError(f"History key column {k!r} not found in Orders table.")
+    df = df.dropna(subset=keys).drop_duplicates(subset=keys, keep="last")
+    stamp = _utc_stamp(scraped_at)
+    staged = []
+    legacy = []  # (key, "/"-joined key written by earlier versions) for composite keys
+    for record in df.astype(object).where(df.notna(), None).to_dict("records"):
+        data = json.dumps(record, sort_keys=True, default=str, ensure_ascii=False)
+        parts = []
+        for k in keys:
+            value = record[k]
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)  # 1001.0 from a NaN-widened column is order 1001
+            parts.append(str(value))
+        if len(parts) == 1:
+            order_key = parts[0]
+        else:
+            order_key = json.dumps(parts, ensure_ascii=False)
+            legacy.append((order_key, "/".join(parts)))
+        staged.append((order_key, hashlib.sha1(data.encode("utf-8")).hexdigest(), data))
+
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders_snapshot ("
+            "order_key TEXT PRIMARY KEY, row_hash TEXT NOT NULL, scraped_at TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders_history ("
+            "id INTEGER PRIMARY KEY, scraped_at TEXT NOT NULL, order_key TEXT NOT NULL, "
+            "change TEXT NOT NULL, row_hash TEXT NOT NULL, prev_hash TEXT, data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_orders_history_scraped_at ON orders_history (scraped_at)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_orders_history_key ON orders_history (order_key, scraped_at)"
+        )
+        if legacy and conn.execute("SELECT 1 FROM orders_snapshot WHERE order_key NOT LIKE '[%' LIMIT 1").fetchone():
+            conn.executemany("UPDATE OR IGNORE orders_snapshot SET order_key = ? WHERE order_key = ?", legacy)
+            conn.executemany("UPDATE orders_history SET order_key = ? WHERE order_key = ?", legacy)
+        conn.execute("DROP TABLE IF EXISTS temp._history_stage")
+        conn.execute("CREATE TEMP TABLE _history_stage (order_key TEXT PRIMARY KEY, row_hash TEXT, data TEXT)")
+        conn.executemany("INSERT INTO _history_stage VALUES (?, ?, ?)", staged)
+
+        new = conn.execute(
+            "SELECT COUNT(*) FROM _history_stage s WHERE NOT EXISTS "
+            "(SELECT 1 FROM orders_snapshot p WHERE p.order_key = s.order_key)"
+        ).fetchone()[0]
+        before = conn.total_changes
+        conn.execute(
+            "INSERT INTO orders_history (scraped_at, order_key, change, row_hash, prev_hash, data) "
+            "SELECT ?, s.order_key, CASE WHEN p.row_hash IS NULL THEN 'new' ELSE 'changed' END, "
+            "s.row_hash, p.row_hash, s.data "
+            "FROM _history_stage s LEFT JOIN orders_snapshot p ON p.order_key = s.order_key "
+            "WHERE p.row_hash IS NULL OR p.row_hash != s.row_hash",
+            (stamp,),
+        )
+        appended = conn.total_changes - before
+        conn.execute(
+            "INSERT INTO orders_snapshot (order_key, row_hash, scraped_at) "
+            "SELECT order_key, row_hash, ? FROM _history_stage WHERE true "
+            "ON CONFLICT(order_key) DO UPDATE SET row_hash = excluded.row_hash, scraped_at = excluded.scraped_at "
+            "WHERE orders_snapshot.row_hash != excluded.row_hash",
+            (stamp,),
+        )
+        conn.execute("DROP TABLE temp._history_stage")
+
+    return {"new": new, "changed": appended - new, "unchanged": len(staged) - appended}
+
+
+def changes_since(conn, since: datetime) -> pd.DataFrame:
+    """Rows appended to orders_history after ``since``, oldest first (index range scan)."""
+    return pd.read_sql_query(
+        "SELECT scraped_at, order_key, change, data FROM orders_history WHERE scraped_at > ? "
+        "ORDER BY scraped_at, id",
+        conn,
+        params=(_utc_stamp(since),),
+    )
+
+
+# ------------------------------ Typing ------------------------------
+
+# Columns whose name contains one of these are always stored as categoricals.
+CATEGORY_COLUMNS = ("status", "workstation")
+# Date layouts tried, in order, against a sample of each text column. A sample that also
+# reads with day and month swapped ("03/04/2024") is ambiguous and the column stays text.
+DATE_FORMATS = (
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p", "%b %d, %Y", "%d %b %Y", "%d-%b-%Y",
+)
+_MONEY_RE = re.compile(r"\(?-?\s*[$€£]\s*-?[\d,]*\.?\d+\)?")
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(\.\d+)?|-?\.\d+")
+_TYPE_SAMPLE = 200         # values inspected per column when guessing its type
+
+# Column name -> (kind, date format) from earlier scrapes. A cached kind is re-checked
+# against the current sample (one cheap test) instead of re-running full detection;
+# only unambiguous detections are stored, so a day/month guess is never carried over.
+_COLUMN_KIND_CACHE: Dict[str, Tuple[str, Optional[str]]] = {}
+
+
+def _string_dtype(storage: str = "auto") -> pd.StringDtype:
+    """pandas string dtype; "auto" picks the Arrow-backed one when pyarrow is installed."""
+    if storage == "auto":
+        try:
+            import pyarrow  # noqa: F401
+            storage = "pyarrow"
+        except ImportError:
+            storage = "python"
+    return pd.StringDtype(storage)
+
+
+def _is_text(s: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype)
+
+
+def normalize_text_columns(df: pd.DataFrame, string_storage: str = "auto") -> pd.DataFrame:
+    """Strip whitespace in every text column, keeping missing values missing.
+
+    Text columns become a pandas StringDtype (Arrow-backed when available) with blank
+    cells as <NA> -- never the literal "nan" that astype(str) produces.
+    """
+    dtype = _string_dtype(string_storage)
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if _is_text(s):
+            s = s.astype(dtype).str.strip()
+            s = s.mask(s == "")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def _fits_kind(kind: str, fmt: Optional[str], sample: pd.Series) -> bool:
+    """Every value of the sample fits the kind."""
+    if kind == "money":
+        return bool(sample.str.fullmatch(_MONEY_RE).all())
+    if kind == "number":
+        return bool(sample.str.fullmatch(_NUMBER_RE).all())
+    if kind == "date":
+        return bool(pd.to_datetime(sample, format=fmt, errors="coerce").notna().all())
+    return True
+
+
+def _swap_day_month(fmt: str) -> Optional[str]:
+    """The day-first reading of a month-first slash layout, or vice versa."""
+    if "/" not in fmt or "%m" not in fmt or "%d" not in fmt:
+        return None
+    return fmt.replace("%m", "\0").replace("%d", "%m").replace("\0", "%d")
+
+
+def _detect_kind(name: str, sample: pd.Series) -> Tuple[str, Optional[str]]:
+    if any(c in name.lower() for c in CATEGORY_COLUMNS):
+        return "category", None
+    for kind in ("money", "number"):
+        if _fits_kind(kind, None, sample):
+            return kind, None
+    for fmt in DATE_FORMATS:
+        if _fits_kind("date", fmt, sample):
+            swapped = _swap_day_month(fmt)
+            if swapped is not None and _fits_kind("date", swapped, sample):
+                return "text", None  # could be either; don't guess
+            return "date", fmt
+    return "text", None
+
+
+def _convert_kind(text: pd.Series, kind: str, fmt: Optional[str]) -> Optional[pd.Series]:
+    """text converted to kind, or None if any present value would not survive it."""
+    if kind == "money":
+        cleaned = text.str.replace(r"[$€£,\s]", "", regex=True).str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+        out = pd.to_numeric(cleaned, errors="coerce").astype("float64")
+    elif kind == "number":
+        out = pd.to_numeric(text.str.replace(",", "", regex=False), errors="coerce")
+        present = out.dropna()
+        out = out.astype("Int64") if (present == present.round()).all() else out.astype("float64")
+    elif kind == "date":
+        out = pd.to_datetime(text, format=fmt, errors="coerce")
+    else:
+        return text
+    if (out.isna() & text.notna()).any():
+        return None
+    return out
+
+
+def infer_order_dtypes(
+    df: pd.DataFrame, string_storage: str = "auto", kinds: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+) -> pd.DataFrame:
+    """Return a copy of df with text columns converted to analytic types.
+
+    - Status/Workstation (CATEGORY_COLUMNS) and other low-cardinality text -> category
+    - money ("$1,234.50", "($12.00)") -> float64
+    - quantities ("1,200") -> Int64, other numbers -> float64
+    - dates matching one of DATE_FORMATS (not day/month-ambiguous) -> datetime64
+    Non-text columns are untouched; text that fits no type stays a string column, and so
+    does a column where any value ("TBD", "5 (backorder)") would not convert -- nothing
+    is coerced to missing. Detected kinds are cached per column name across calls. With
+    ``kinds``, columns it names are converted to those kinds without detection and the
+    kinds applied to the rest are added to it, so every batch of a streamed table gets
+    the first batch's types.
+    """
+    df = normalize_text_columns(df, string_storage)
+    out = {}
+    for col in df.columns:
+        text = df[col]
+        values = text.dropna() if _is_text(text) else None
+        if values is None or values.empty:
+            out[col] = text
+            continue
+        name = str(col)
+        if kinds is not None and name in kinds:
+            kind, fmt = kinds[name]
+        else:
+            sample = values.iloc[:_TYPE_SAMPLE]
+            cached = _COLUMN_KIND_CACHE.get(name)
+            if cached is not None and _fits_kind(cached[0], cached[1], sample):
+                kind, fmt = cached
+            else:
+                kind, fmt = _detect_kind(name, sample)
+                if kind != "text":
+                    _COLUMN_KIND_CACHE[name] = (kind, fmt)
+            if kind == "text" and len(values) >= 20 and values.nunique() <= len(values) // 2:
+                kind = "category"  # low-cardinality text
+        if kind == "category":
+            out[col] = text.astype("category")
+        else:
+            converted = _convert_kind(text, kind, fmt)
+            if converted is None:
+                kind, fmt, converted = "text", None, text
+            out[col] = converted
+        if kinds is not None and name not in kinds:
+            kinds[name] = (kind, fmt)
+    return pd.DataFrame(out, index=df.index)
+
+
+def concat_order_frames(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat that keeps columns categorical when every part has them as category.
+
+    (Plain concat falls back to object when the parts' category sets differ.)
+    """
+    df = pd.concat(parts, ignore_index=True)
+    for col in df.columns:
+        if df[col].dtype != "category" and all(
+            col in p.columns and isinstance(p[col].dtype, pd.CategoricalDtype) for p in parts
+        ):
+            df[col] = df[col].astype("category")
+    return df
+
+
+# ----------------------------- Outputs ------------------------------
+
+def _temp_path(path: str, keep_ext: bool = True) -> Tuple[str, str]:
+    """(absolute path, unused temp path next to it) for writing a file and renaming it into place.
+
+    keep_ext=False ends the temp name in ".tmp", for files picked up by extension from the
+    same folder (node_exporter reads every *.prom in its textfile directory).
+    """
+    path = os.path.abspath(path)
+    folder, name = os.path.split(path)
+    # Keep the extension (pandas picks the Excel engine from it) and let the writer create
+    # the file, so it gets normal umask permissions rather than mkstemp's 0600.
+    ext = os.path.splitext(name)[1] if keep_ext else ""
+    return path, os.path.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.tmp{ext}")
+
+
+def _atomic_write(path: str, write: Callable[[str], None], keep_ext: bool = True) -> str:
+    """Call write(tmp_path) on a temp file next to path, then rename it over path."""
+    path, tmp = _temp_path(path, keep_ext)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def _report_saved(paths: Dict[str, str]) -> None:
+    print("[*] Saved:")
+    for fmt, path in paths.items():
+        print(f"  {fmt.upper():<7}: {path}")
+
+# ------------------------ Streaming outputs -------------------------
+
+PREVIEW_ROWS = 20  # rows kept from a streamed table for the GUI preview
+STREAM_QUEUE_BATCHES = 2  # batches a streamed output may fall behind the download
+
+
+def _widens(s: pd.Series, dtype) -> bool:
+    """Whether s converts to dtype without losing or reinterpreting a value."""
+    if s.isna().all():
+        # numpy ints/bools have no missing value; everything else can hold an all-missing batch
+        return not (dtype.kind in "iub" and not isinstance(dtype, pd.api.extensions.ExtensionDtype))
+    textual = (_is_text(s) or isinstance(s.dtype, pd.CategoricalDtype),
+               pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype))
+    if all(textual):
+        return True  # category <-> string: same values, the first batch's choice wins
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pd.api.types.is_float_dtype(dtype) or (
+            pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, pd.api.extensions.ExtensionDtype)
+        )
+    return pd.api.types.is_datetime64_any_dtype(s.dtype) and pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+class BatchCleaner:
+    """_clean_df for a table that arrives in batches.
+
+    The first batch decides the columns and their types; later batches reuse its column
+    kinds (so dates are never re-read as text) and are converted to its dtypes. A batch
+    whose data those types can't hold -- a column that was empty in the first batch
+    filling in, text in a numeric column, fractions in an integer one -- raises
+    StreamFallback, since the whole-table parse would have typed that column differently.
+    """
+
+    def __init__(self, cfg: ScrapeConfig):
+        self.cfg = cfg
+        self.kinds: Dict[str, Tuple[str, Optional[str]]] = {}
+        self.dtypes: Optional[pd.Series] = None
+
+    def clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.columns = [str(c).strip().replace("\n", " ") for c in df.columns]
+        if self.cfg.typed_columns:
+            df = infer_order_dtypes(df, self.cfg.string_storage, self.kinds)
+        else:
+            df = normalize_text_columns(df, self.cfg.string_storage)
+        if self.dtypes is None:
+            df = df.dropna(axis=1, how="all")
+            self.dtypes = df.dtypes
+            return df
+        for col in df.columns:
+            if col not in self.dtypes.index and df[col].notna().any():
+                raise StreamFallback(f"column {col!r} was empty in the first batch")
+        out = {}
+        for col, dtype in self.dtypes.items():
+            s = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+            if isinstance(dtype, pd.CategoricalDtype) and _widens(s, dtype):
+                # Each batch keeps its own categories; casting to the first batch's would drop new values.
+                out[col] = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+                continue
+            if s.dtype != dtype:
+                if not _widens(s, dtype):
+                    raise StreamFallback(f"column {col!r} changed type between batches ({dtype} -> {s.dtype})")
+                s = s.astype(dtype)
+            out[col] = s
+        return pd.DataFrame(out, index=df.index)
+
+
+class _FileSink:
+    """Streamed output file: written as a temp file next to ``path``, renamed over it by close()."""
+
+    def __init__(self, path: str):
+        self.path, self.tmp = _temp_path(path)
+        self.rows = 0
+        self._f = None
+
+    def _open(self):
+        if self._f is None:
+            self._f = open(self.tmp, "w", newline="", encoding="utf-8")
+        return self._f
+
+    def _finish(self) -> None:
+        if self._f is not None:
+            self._f.close()
+
+    def close(self) -> str:
+        self._finish()
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        try:
+            self._finish()
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+
+
+class CsvSink(_FileSink):
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._dates_only: Dict[str, bool] = {}
+
+    def write(self, batch: pd.DataFrame) -> None:
+        # to_csv drops the time from a datetime column only when every value is midnight;
+        # a column must make that choice the same way in every batch.
+        for col in batch.columns:
+            s = batch[col]
+            if pd.api.types.is_datetime64_any_dtype(s.dtype) and s.notna().any():
+                s = s.dropna()
+                only = bool((s == s.dt.normalize()).all())
+                if self._dates_only.setdefault(col, only) != only:
+                    raise StreamFallback(f"column {col!r} has times in some batches only")
+        batch.to_csv(self._open(), header=self.rows == 0, index=False)
+        self.rows += len(batch)
+
+
+class JsonlSink(_FileSink):
+    def write(self, batch: pd.DataFrame) -> None:
+        batch.to_json(self._open(), orient="records", lines=True, date_format="iso", force_ascii=False)
+        self.rows += len(batch)
+
+
+class ParquetSink(_FileSink):
+    """One row group per batch, typed like _write_parquet; the first batch fixes the schema."""
+
+    def __init__(self, path: str, compression: Optional[str], string_storage: str):
+        super().__init__(path)
+        self.compression = compression
+        self.string_storage = string_storage
+        self.kinds: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._schema = None
+
+    def write(self, batch: pd.DataFrame) -> None:
+        import pyarrow as pa  # optional dependency, only needed for parquet output
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(infer_order_dtypes(batch, self.string_storage, self.kinds), preserve_index=False)
+        if self._f is None:
+            # int32 dictionary indices, so later batches with more categories still fit
+            fields = [
+                pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+                for f in table.schema
+            ]
+            self._schema = pa.schema(fields, metadata=table.schema.metadata)
+            self._f = pq.ParquetWriter(self.tmp, self._schema, compression=self.compression, use_dictionary=True)
+        try:
+            table = table.cast(self._schema)
+        except (pa.ArrowException, ValueError) as e:
+            raise StreamFallback(f"Parquet column types changed between batches: {e}")
+        self._f.write_table(table)
+        self.rows += len(batch)
+
+
+class XlsxSink(_FileSink):
+    """openpyxl write-only workbook: rows go to disk as they arrive. Same sheet name, header
+    style and row limit as DataFrame.to_excel."""
+
+    MAX_ROWS = 1048576
+
+    def write(self, batch: pd.DataFrame) -> None:
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        if self.rows + len(batch) + 1 > self.MAX_ROWS:
+            raise ValueError(f"This sheet is too large! Max sheet size is: {self.MAX_ROWS} rows")
+        if self._f is None:
+            from openpyxl import Workbook
+
+            self._f = Workbook(write_only=True)
+            self._ws = self._f.create_sheet("Sheet1")
+            thin = Side(style="thin")
+            header = []
+            for name in batch.columns:
+                cell = WriteOnlyCell(self._ws, value=str(name))
+                cell.font = Font(bold=True)
+                cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+                cell.alignment = Alignment(horizontal="center", vertical="top")
+                header.append(cell)
+            self._ws.append(header)
+        for row in batch.astype(object).where(batch.notna(), None).itertuples(index=False, name=None):
+            self._ws.append(row)
+        self.rows += len(batch)
+
+    def _finish(self) -> None:
+        if self._f is not None:
+            self._f.save(self.tmp)
+            self._f = None
+
+    def abort(self) -> None:
+        if self._f is not None:
+            self._ws.close()  # ends the sheet's spool file (openpyxl deletes it at exit) without saving
+            self._f = None
+        super().abort()
+
+
+class SqliteSink:
+    """Replace-mode SQLite output: each batch is one executemany into _orders_new, which
+    close() swaps in for orders the way _write_sqlite does."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.conn = None
+        self._insert = ""
+
+    def write(self, batch: pd.DataFrame) -> None:
+        if self.conn is None:
+            import sqlite3
+
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("DROP TABLE IF EXISTS _orders_new")
+            _ensure_orders_table(self.conn, batch, "_orders_new")
+            self._insert = f"INSERT INTO _orders_new VALUES ({', '.join('?' for _ in batch.columns)})"
+        self.conn.executemany(self._insert, _sqlite_rows(batch))
+
+    def close(self) -> str:
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return self.path
+        try:
+            conn.commit()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DROP TABLE IF EXISTS orders")
+                conn.execute("ALTER TABLE _orders_new RENAME TO orders")
+        finally:
+            conn.close()
+        return self.path
+
+    def abort(self) -> None:
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.rollback()
+                conn.execute("DROP TABLE IF EXISTS _orders_new")
+            finally:
+                conn.close()
+
+
+class _SinkWriter:
+    """One streamed output on its own thread, fed through a bounded queue.
+
+    The outputs are written concurrently, as save_outputs does for a whole table, and
+    the slowest one holds the download back once it is STREAM_QUEUE_BATCHES batches
+    behind, so memory stays bounded. The sink is also closed or aborted on that thread
+    (SQLite connections can't change threads). A failed write is kept in ``error``;
+    later batches are then dropped so put() never blocks.
+    """
+
+    _CLOSE, _ABORT = object(), object()
+
+    def __init__(self, fmt: str, sink, metrics: "RunMetrics"):
+        import queue
+
+        self.fmt, self.sink, self.metrics = fmt, sink, metrics
+        self.error: Optional[BaseException] = None
+        self.path: Optional[str] = None
+        self._queue = queue.Queue(maxsize=STREAM_QUEUE_BATCHES)
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name=f"ybsnow-write-{fmt}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._ABORT:
+                    self.sink.abort()
+                    return
+                if item is self._CLOSE:
+                    self.path = self.sink.close()
+                    return
+                if self.error is None and not self._cancelled:
+                    with self.metrics.stage(f"write_{self.fmt}"):
+                        self.sink.write(item)
+            except BaseException as e:
+                self.error = self.error or e
+            finally:
+                self._queue.task_done()
+
+    def put(self, batch: pd.DataFrame) -> None:
+        self._queue.put(batch)
+
+    def wait(self) -> None:
+        """Block until every batch put so far is written (or dropped after an error)."""
+        self._queue.join()
+
+    def finish(self, abort: bool = False) -> None:
+        """Queue the sink's close (or abort); join() waits for it."""
+        if self._thread.is_alive():
+            self._cancelled = self._cancelled or abort
+            self._queue.put(self._ABORT if abort else self._CLOSE)
+
+    def join(self) -> None:
+        self._thread.join()
+
+
+@dataclass
+class StreamResult:
+    paths: Dict[str, str]   # format -> absolute path, as save_outputs returns
+    rows: int
+    columns: List[str]
+    preview: pd.DataFrame   # first PREVIEW_ROWS rows
+
+
+# ------------------------- Change detection -------------------------
+
+DEFAULT_CHANGE_STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "ybsnow", "validators.json")
+
+_TABLE_TAG_RE = re.compile(r"<(/?)table\b([^>]*)>", re.I)
+_ATTR_RE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+_VOLATILE_RE = re.compile(r"<script\b.*?</script\s*>|<!--.*?-->", re.I | re.S)
+
+
+def orders_table_region(html: str) -> str:
+    """Raw markup of the best ORDERS_TABLE_SELECTORS table, found with a tag scan (no parse).
+
+    Falls back to the whole page minus scripts and comments, which commonly carry
+    per-request noise (nonces, timestamps) that would defeat hashing.
+    """
+    best: Optional[Tuple[int, int]] = None  # (rank, offset)
+    for m in _TABLE_TAG_RE.finditer(html):
+        if m.group(1):
+            continue
+        attrib = {k.lower(): a or b or c for k, a, b, c in _ATTR_RE.findall(m.group(2))}
+        rank = _selector_rank("table", attrib)
+        if rank is not None and (best is None or rank < best[0]):
+            best = (rank, m.start())
+            if rank == 0:
+                break
+    if best is None:
+        return _VOLATILE_RE.sub("", html)
+    depth = 0
+    for m in _TABLE_TAG_RE.finditer(html, best[1]):
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            return html[best[1]:m.end()]
+    return html[best[1]:]
+
+
+class ChangeTracker:
+    """Per-URL HTTP validators (ETag / Last-Modified) and orders-table hash, kept on disk.
+
+    fetch_orders_html(conditional=True) sends the stored validators and compares the
+    table hash; new values stay pending until commit() is called after outputs are saved,
+    so an interrupted run never causes the next one to skip. Check/skip counters are
+    cumulative across runs and only count conditional fetches, where a skip was possible.
+    Saves merge into the file like SelectorCache's, so concurrent runs keep each other's
+    URLs and counts.
+    """
+
+    _lock = threading.Lock()  # serialises read-merge-write of the file across threads
+
+    def __init__(self, path: str, url: str):
+        self.path = path
+        self.url = url
+        self.entry = self._read().get(url, {})
+        self._pending: Optional[dict] = None
+        self._unsaved = {"checks": 0, "skips": 0}  # counted here since the last save
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def checks(self) -> int:
+        return self.entry.get("checks", 0)
+
+    @property
+    def skips(self) -> int:
+        return self.entry.get("skips", 0)
+
+    @property
+    def skip_rate(self) -> float:
+        return self.skips / self.checks if self.checks else 0.0
+
+    def request_headers(self) -> dict:
+        headers = {}
+        if self.entry.get("etag"):
+            headers["If-None-Match"] = self.entry["etag"]
+        if self.entry.get("last_modified"):
+            headers["If-Modified-Since"] = self.entry["last_modified"]
+        return headers
+
+    def not_modified(self) -> None:
+        """Record a 304 response."""
+        self._count(skipped=True)
+        self._save()
+
+    def observe(self, headers, html: str, conditional: bool = True) -> bool:
+        """Stage this response's validators and table hash; True if the table changed.
+
+        Counts a check (and a skip if unchanged) only when ``conditional``: otherwise the
+        page is parsed and saved whatever the hash says.
+        """
+        digest = hashlib.sha256(orders_table_region(html).encode("utf-8")).hexdigest()
+        changed = digest != self.entry.get("table_hash")
+        self._pending = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "table_hash": digest,
+        }
+        if conditional:
+            self._count(skipped=not changed)
+        if not changed:
+            self.commit()  # same table: nothing downstream to wait for
+        return changed
+
+    def commit(self) -> None:
+        if self._pending is not None:
+            self.entry.update(self._pending)
+            self._pending = None
+        self._save()
+
+    def _count(self, skipped: bool) -> None:
+        self.entry["checks"] = self.checks + 1
+        self.entry["skips"] = self.skips + int(skipped)
+        self._unsaved["checks"] += 1
+        self._unsaved["skips"] += int(skipped)
+
+    def _save(self) -> None:
+        with self._lock:
+            state = self._read()
+            stored = state.get(self.url, {})
+            entry = {**stored, **self.entry}
+            for counter, n in self._unsaved.items():
+                entry[counter] = stored.get(counter, 0) + n
+            state[self.url] = self.entry = entry
+            self._unsaved = {"checks": 0, "skips": 0}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            _atomic_write(self.path, lambda tmp: _write_json(tmp, state))
+
+
+def _write_json(path: str, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+# ------------------------ Learned selectors -------------------------
+
+DEFAULT_SELECTOR_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "ybsnow", "selectors.json")
+
+
+def _table_xpath(table) -> str:
+    """XPath back to a table: by id when it has a usable one, else its position in the tree."""
+    table_id = table.get("id")
+    if table_id and '"' not in table_id:
+        return f'//table[@id="{table_id}"]'
+    return table.getroottree().getpath(table)
+
+
+def _column_signature(df: pd.DataFrame) -> List[str]:
+    return [str(c) for c in df.columns]
+
+
+class SelectorCache:
+    """Orders table location learned from the read_html fallback, per orders URL, kept on disk.
+
+    When no ORDERS_TABLE_SELECTORS entry matches, the table picked by the full scan is
+    remembered as an XPath plus its column signature. Later pages from the same URL read
+    just that table; if it is gone or its columns changed, the full scan runs and the
+    entry is re-learned. Saves merge into the file, so concurrent batch targets do not
+    drop each other's entries.
+    """
+
+    _lock = threading.Lock()  # serialises read-merge-write of the file across threads
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = self._read()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, url: str, page: OrdersPage) -> Optional[pd.DataFrame]:
+        """The learned table for url on this page, or None if unknown or no longer matching."""
+        entry = self.entries.get(url)
+        if not entry:
+            return None
+        try:
+            found = page.tree.xpath(entry["xpath"])
+        except Exception:  # malformed entry (hand-edited file)
+            return None
+        if not found or getattr(found[0], "tag", None) != "table":
+            return None
+        try:
+            df = pd.read_html(StringIO(page.table_html(found[0])))[0]
+        except (ValueError, IndexError):
+            return None
+        if _column_signature(df) != entry.get("columns"):
+            return None
+        page.table = found[0]
+        return df
+
+    def learn(self, url: str, table, df: pd.DataFrame) -> None:
+        entry = {"xpath": _table_xpath(table), "columns": _column_signature(df)}
+        if self.entries.get(url) == entry:
+            return
+        self.entries[url] = entry
+        with self._lock:
+            state = self._read()
+            state[url] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            _atomic_write(self.path, lambda tmp: _write_json(tmp, state))
+
+
+# --------------------------- Login check ----------------------------
+
+_FORM_TAG_RE = re.compile(rb"<form\b([^>]*)>", re.I)
+# Cookies whose disappearance after a request means the server ended the session.
+_SESSION_COOKIE_RE = re.compile(r"sess|sid|auth|token|login|remember", re.I)
+
+
+def _soup_has_signin_form(html: Union[str, bytes]) -> bool:
+    """The original full-parse check; only used to confirm a hit from the byte scan."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    return soup.find("form", attrs={"name": "signin", "id": "signin"}) is not None
+
+
+def looks_like_login_page(html: Union[str, bytes]) -> bool:
+    """True if the page contains <form name="signin" id="signin"> (the sign-in form).
+
+    A byte-level scan answers nearly every page without building a tree: pages that never
+    mention "signin" return at once, otherwise only <form> tags' attributes are examined.
+    A hit is confirmed with a BeautifulSoup parse, so a form inside a comment or script
+    string is not mistaken for the real thing.
+    """
+    data = html.encode("utf-8", "surrogatepass") if isinstance(html, str) else html
+    if b"signin" not in data:
+        return False
+    for m in _FORM_TAG_RE.finditer(data):
+        attrib: Dict[str, str] = {}
+        for k, a, b, c in _ATTR_RE.findall(m.group(1).decode("latin-1")):
+            attrib.setdefault(k.lower(), a or b or c)
+        if attrib.get("name") == "signin" and attrib.get("id") == "signin":
+            return _soup_has_signin_form(html)
+    return False
+
+
+def session_cookie_names(jar) -> set:
+    return {c.name for c in jar if _SESSION_COOKIE_RE.search(c.name)}
+
+
+def _same_page(url: str, other: str) -> bool:
+    """Same scheme/host/path/query (parameters in any order), ignoring the fragment.
+
+    The query counts: on sites whose login page is index.php, index.php?page=orders is
+    a different page.
+    """
+    a, b = urlsplit(url), urlsplit(other)
+    return (a.scheme, a.netloc.lower(), a.path or "/", sorted(parse_qsl(a.query, keep_blank_values=True))) == (
+        b.scheme, b.netloc.lower(), b.path or "/", sorted(parse_qsl(b.query, keep_blank_values=True))
+    )
+
+
+# -------------------------- Order details ---------------------------
+
+_ITEM_RE = re.compile(
+    "|".join(re.escape(c) for c in sorted({c.lower() for c in ITEM_COLUMNS}, key=len, reverse=True))
+)
+DETAIL_CACHE_TABLE = "order_details_seen"
+
+
+def row_links(table) -> List[Optional[str]]:
+    """First link of each body row of a <table> element, in the rows read_html / the
+    extractor produce (header rows and cell-less rows skipped, nested tables ignored)."""
+    links: List[Optional[str]] = []
+    in_body = False
+    # Footer rows last, as read_html and the extractor order them
+    for tr in table.xpath("./tr | ./thead/tr | ./tbody/tr") + table.xpath("./tfoot/tr"):
+        cells = list(tr.iterchildren("td", "th"))
+        if not cells:
+            continue
+        if not in_body and (tr.getparent().tag == "thead" or all(c.tag == "th" for c in cells)):
+            continue
+        in_body = True
+        links.append(next(
+            (a.get("href") for a in tr.iter("a") if a.get("href") and next(a.iterancestors("table")) is table),
+            None,
+        ))
+    return links
+
+
+def pick_items_table(page: OrdersPage):
+    """Table on a detail page whose header names the most ITEM_COLUMNS (at least one), or None."""
+    best = None
+    best_score = 0
+    for table in page.tree.iter("table"):
+        header, body = table_sample(table, 1)
+        if not body or len(header) < 2:
+            continue
+        score = sum(1 for h in header if _ITEM_RE.search(h.lower()))
+        if score > best_score:
+            best, best_score = table, score
+    return best
+
+
+class HostRateLimiter:
+    """At most ``rate`` requests per second to each host, shared by a pool of threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next.get(host, now))
+            self._next[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def order_row_hashes(df: pd.DataFrame) -> List[str]:
+    """Per-row content hash of the orders table (detail URLs excluded)."""
+    values = df.drop(columns=[DETAIL_URL_COLUMN], errors="ignore")
+    return [format(h, "016x") for h in pd.util.hash_pandas_object(values, index=False)]
+
+
+def load_detail_hashes(conn) -> Dict[str, str]:
+    """{detail URL: orders-row hash} for detail pages already stored in order_items."""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {DETAIL_CACHE_TABLE} (url TEXT PRIMARY KEY, row_hash TEXT, fetched_at TEXT)")
+    return dict(conn.execute(f"SELECT url, row_hash FROM {DETAIL_CACHE_TABLE}"))
+
+
+def store_order_items(conn, items: pd.DataFrame, hashes: Dict[str, str], table: str = "order_items") -> None:
+    """Replace the items of every detail URL in ``hashes`` and record their row hashes, in
+    one transaction (a crawled order whose page lists no items ends up with none)."""
+    stamp = _utc_stamp()
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if not items.empty:
+            _ensure_orders_table(conn, items, table)
+        if conn.execute(f"PRAGMA table_info({_qi(table)})").fetchall():
+            conn.executemany(
+                f"DELETE FROM {_qi(table)} WHERE {_qi(DETAIL_URL_COLUMN)} = ?", [(u,) for u in hashes]
+            )
+        if not items.empty:
+            cols = [str(c) for c in items.columns]
+            conn.executemany(
+                f"INSERT INTO {_qi(table)} ({', '.join(_qi(c) for c in cols)}) VALUES ({', '.join('?' for _ in cols)})",
+                _sqlite_rows(items),
+            )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {DETAIL_CACHE_TABLE} (url, row_hash, fetched_at) VALUES (?, ?, ?)",
+            [(u, h, stamp) for u, h in hashes.items()],
+        )
+
+
+# ---------------------------- Rendering -----------------------------
+
+# URL patterns a render never needs: images, fonts and stylesheets.
+RENDER_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.css",
+]
+
+
+class BrowserPool:
+    """Warm headless browsers handed out one render at a time and kept for the next.
+
+    Up to ``size`` browsers are launched on demand; callers beyond that wait for one to
+    come back. A browser that fails mid-render (or fails to launch) is discarded and its
+    slot freed, waking a waiter to launch a replacement. close() is final: browsers still
+    out are quit when they come back, and acquire() raises RuntimeError.
+    """
+
+    def __init__(self, launch: Callable[[], object], size: int = 1):
+        self._launch = launch
+        self._size = max(1, size)
+        self._idle: list = []  # most recently used last, handed out first: warmest cache
+        self._cond = threading.Condition()
+        self._launched = 0
+        self._all: list = []
+        self._closed = False
+
+    def acquire(self):
+        with self._cond:
+            while not self._closed and not self._idle and self._launched >= self._size:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("Browser pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._launched += 1
+        try:
+            browser = self._launch()
+        except BaseException:
+            self._free_slot()
+            raise
+        with self._cond:
+            if not self._closed:
+                self._all.append(browser)
+                return browser
+        self._quit(browser)  # closed while it was starting
+        raise RuntimeError("Browser pool is closed")
+
+    def release(self, browser, broken: bool = False) -> None:
+        with self._cond:
+            owned = browser in self._all  # close() has already let go of it otherwise
+            if owned and not broken:
+                self._idle.append(browser)
+                self._cond.notify()
+                return
+            if owned:
+                self._all.remove(browser)
+                self._launched -= 1
+                self._cond.notify()
+        self._quit(browser)
+
+    def _free_slot(self) -> None:
+        with self._cond:
+            self._launched -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _quit(browser) -> None:
+        try:
+            browser.quit()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            browsers, self._all = self._all, []
+            self._idle = []
+            self._cond.notify_all()
+        for browser in browsers:
+            self._quit(browser)
+
+
+class SeleniumRenderer:
+    """Headless Chrome (Selenium) renderer for Orders pages built by JavaScript.
+
+    Browsers stay warm in a BrowserPool of cfg.render_pool. Before each render the
+    requests session's cookies are copied in over CDP, so the browser is already logged
+    in; images, fonts and CSS are blocked. The page source is taken once a table with
+    data cells appears, or after cfg.render_timeout seconds.
+    """
+
+    def __init__(self, cfg: ScrapeConfig):
+        self.cfg = cfg
+        self.pool = BrowserPool(self._launch, cfg.render_pool)
+
+    def _launch(self):
+        from selenium import webdriver  # optional dependency, only needed for --render selenium
+
+        opts = webdriver.ChromeOptions()
+        opts.add_argument("--headless=new")
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_argument(f"--user-agent={USER_AGENT}")
+        opts.page_load_strategy = "eager"  # DOM ready is enough; the wait below covers XHR
+        driver = webdriver.Chrome(options=opts)
+        driver.set_page_load_timeout(self.cfg.render_timeout)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": RENDER_BLOCKED_URLS})
+        return driver
+
+    def render(self, url: str, jar: CookieJar) -> str:
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        try:
+            driver = self.pool.acquire()
+        except WebDriverException as e:
+            raise RuntimeError(f"Could not start headless Chrome: {e}")
+        broken = False
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for c in jar:
+                cookie = {"name": c.name, "value": c.value or "", "path": c.path or "/", "secure": bool(c.secure)}
+                if c.domain:
+                    cookie["domain"] = c.domain
+                else:
+                    cookie["url"] = url
+                if c.expires:
+                    cookie["expires"] = c.expires
+                driver.execute_cdp_cmd("Network.setCookie", cookie)
+            try:
+                driver.get(url)
+                WebDriverWait(driver, self.cfg.render_timeout).until(
+                    lambda d: d.execute_script("return !!document.querySelector('table td, table th')")
+                )
+            except TimeoutException:
+                pass  # hand back whatever rendered; the parser reports a missing table
+            return driver.page_source
+        except WebDriverException as e:
+            broken = True
+            raise RuntimeError(f"Browser render of {url} failed: {e}")
+        finally:
+            self.pool.release(driver, broken)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+# --render choices: name -> class taking the ScrapeConfig. A renderer needs
+# render(url, cookie_jar) -> html and close(); register others here.
+RENDERERS: Dict[str, Callable[[ScrapeConfig], object]] = {"selenium": SeleniumRenderer}
+_RENDERER_INSTANCES: Dict[Tuple[str, int, float], object] = {}
+_RENDERER_LOCK = threading.Lock()
+
+
+def get_renderer(cfg: ScrapeConfig):
+    """Process-wide renderer for cfg, so watch polls and batch targets share warm browsers."""
+    key = (cfg.renderer, cfg.render_pool, cfg.render_timeout)
+    with _RENDERER_LOCK:
+        renderer = _RENDERER_INSTANCES.get(key)
+        if renderer is None:
+            import atexit
+
+            renderer = _RENDERER_INSTANCES[key] = RENDERERS[cfg.renderer](cfg)
+            atexit.register(renderer.close)
+        return renderer
+
+
+# ----------------------------- Metrics ------------------------------
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far (None where the OS does not say)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def _wire_bytes(r) -> int:
+    """Bytes a requests/httpx response pulled over the wire (compressed), else its body length."""
+    if hasattr(r, "num_bytes_downloaded"):  # httpx
+        return r.num_bytes_downloaded
+    try:
+        return int(r.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return len(r.content)
+
+
+class RunMetrics:
+    """Per-stage wall/CPU time plus run counters, shared by every scraper in the process.
+
+    Stages are timed with ``with metrics.stage(name):`` (or the _timed decorator) and
+    aggregated by name, so a stage run many times (pages, writers on a thread pool)
+    reports its call count and total time. Stages nest: parse_orders_table includes
+    clean_df. CPU time is the whole process's, so overlapping stages share it. write()
+    appends JSON lines, or rewrites a Prometheus textfile for paths ending in .prom.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages: Dict[str, List[float]] = {}  # name -> [calls, wall seconds, cpu seconds]
+            self.counters: Dict[str, int] = {"bytes_downloaded": 0, "rows_parsed": 0}
+            self.started = (time.perf_counter(), time.process_time())
+
+    @contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+
+    def add(self, counter: str, n: int) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "wall_s": time.perf_counter() - self.started[0],
+                "cpu_s": time.process_time() - self.started[1],
+                "peak_rss_bytes": peak_rss_bytes(),
+                "stages": {k: {"calls": int(c), "wall_s": w, "cpu_s": u} for k, (c, w, u) in self.stages.items()},
+                **self.counters,
+            }
+
+    def write(self, path: str) -> None:
+        snap = self.snapshot()
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        if path.endswith(".prom"):
+            _atomic_write(path, lambda tmp: _write_text(tmp, _prometheus_text(snap)), keep_ext=False)
+            return
+        stamp = _utc_stamp()
+        lines = [{"ts": stamp, "type": "stage", "stage": k, **v} for k, v in snap["stages"].items()]
+        lines.append({"ts": stamp, "type": "run", **{k: v for k, v in snap.items() if k != "stages"}})
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(line, sort_keys=True) + "\n" for line in lines)
+
+
+def _prometheus_text(snap: dict) -> str:
+    out = []
+
+    def gauge(name: str, help_text: str, samples: List[Tuple[str, float]]) -> None:
+        out.append(f"# HELP ybsnow_{name} {help_text}")
+        out.append(f"# TYPE ybsnow_{name} gauge")
+        out.extend(f"ybsnow_{name}{labels} {round(value, 6)}" for labels, value in samples)
+
+    stages = sorted(snap["stages"].items())
+    gauge("stage_wall_seconds", "Wall-clock seconds spent in each stage during the last run.",
+          [(f'{{stage="{k}"}}', v["wall_s"]) for k, v in stages])
+    gauge("stage_cpu_seconds", "Process CPU seconds elapsed during each stage in the last run.",
+          [(f'{{stage="{k}"}}', v["cpu_s"]) for k, v in stages])
+    gauge("stage_calls", "Times each stage ran during the last run.",
+          [(f'{{stage="{k}"}}', v["calls"]) for k, v in stages])
+    gauge("run_wall_seconds", "Wall-clock seconds of the last run.", [("", snap["wall_s"])])
+    gauge("run_cpu_seconds", "CPU seconds of the last run.", [("", snap["cpu_s"])])
+    gauge("bytes_downloaded", "Bytes received over HTTP in the last run.", [("", snap["bytes_downloaded"])])
+    gauge("rows_parsed", "Order rows parsed in the last run.", [("", snap["rows_parsed"])])
+    if snap["peak_rss_bytes"] is not None:
+        gauge("peak_rss_bytes", "Peak resident memory of the scraper process.", [("", snap["peak_rss_bytes"])])
+    gauge("last_run_timestamp_seconds", "Unix time the metrics were written.", [("", time.time())])
+    return "\n".join(out) + "\n"
+
+
+def _write_text(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+RUN_METRICS = RunMetrics()
+
+
+def _timed(stage: str):
+    """Method decorator: time each call (or coroutine run) as ``stage`` in self.metrics."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(self, *args, **kwargs):
+                with self.metrics.stage(stage):
+                    return await fn(self, *args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(stage):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---------------------------- Transport -----------------------------
+
+# Responses worth retrying on idempotent requests (rate limited / upstream hiccups).
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def make_http_session(cfg: ScrapeConfig):
+    """requests.Session with a tuned connection pool and retries on idempotent requests.
+
+    GET/HEAD are retried up to cfg.http_retries times on connection errors, read timeouts
+    and RETRY_STATUSES, sleeping cfg.backoff_base * 2**(n-1) seconds plus up to
+    cfg.backoff_jitter of random jitter (capped at cfg.backoff_max), or whatever a
+    Retry-After header asks for. POSTs are only retried when the connection was never
+    established, so the login form is not submitted twice.
+    """
+    import requests
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=cfg.http_retries,
+        connect=cfg.http_retries,
+        read=cfg.http_retries,
+        status=cfg.http_retries,
+        other=0,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=cfg.backoff_base,
+        backoff_max=cfg.backoff_max,
+        backoff_jitter=cfg.backoff_jitter,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand back the last response; raise_for_status reports it
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=cfg.pool_connections,
+        # Let concurrent page fetches share keep-alive connections instead of queueing.
+        pool_maxsize=cfg.pool_maxsize or max(10, cfg.page_workers),
+        max_retries=retry,
+    )
+    sess = requests.Session()
+    # requests already sends Accept-Encoding: gzip, deflate (plus br/zstd when brotli or
+    # zstandard is installed) and iter_content/text decode them transparently.
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    sess.headers.update({
+        "User-Agent": USER_AGENT,
+        "Referer": cfg.base_url,
+    })
+    return sess
+
+
+_CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.I)
+_META_CHARSET_RE = re.compile(rb"""<meta\b[^>]*?charset\s*=\s*["']?([\w.:-]+)""", re.I)
+STREAM_SPOOL_BYTES = 8 << 20  # streamed pages kept in memory up to this size, then spooled to disk
+
+
+def declared_encoding(content_type: Optional[str], head: bytes = b"") -> Optional[str]:
+    """Charset named by the Content-Type header, else by a <meta> tag in the first bytes.
+
+    Returns a Python codec name, or None when nothing (valid) is declared.
+    """
+    import codecs
+
+    m = _CHARSET_RE.search(content_type or "") or _META_CHARSET_RE.search(head[:4096])
+    if not m:
+        return None
+    name = m.group(1)
+    try:
+        return codecs.lookup(name.decode("ascii") if isinstance(name, bytes) else name).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(cfg: ScrapeConfig, attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry number ``attempt`` (1-based), same policy as make_http_session."""
+    import random
 
-@dataclass
-class ScrapeConfig:
-    base_url: str
-    login_url: str
-    orders_url: str
-    email: str
-    password: str
-    out_csv: str = "orders.csv"
-    out_xlsx: str = "orders.xlsx"
-    out_db: str = "orders.db"
-    timeout: int = 30
+    wait = retry_after_seconds(retry_after)
+    if wait is None:
+        wait = min(cfg.backoff_max, cfg.backoff_base * 2 ** (attempt - 1) + random.uniform(0, cfg.backoff_jitter))
+    return wait
 
 
 class YBSNowScraper:
     def __init__(self, cfg: ScrapeConfig):
         self.cfg = cfg
-        self.sess = requests.Session()
-        self.sess.headers.update({
-            "User-Agent": USER_AGENT,
-            "Referer": cfg.base_url,
-        })
+        self.sess = make_http_session(cfg)
+        self.session_cache = (
+            SessionCache(cfg.session_cache_dir, cfg.base_url, cfg.email) if cfg.session_cache_dir else None
+        )
+        self.upsert_counts: Optional[dict] = None  # set by save_outputs in upsert mode
+        self.history_counts: Optional[dict] = None  # set by save_outputs with cfg.history
+        self.change_tracker = (
+            ChangeTracker(cfg.change_state_file, cfg.orders_url) if cfg.change_state_file else None
+        )
+        self.selector_cache = SelectorCache(cfg.selector_cache_file) if cfg.selector_cache_file else None
+        self.orders_unchanged = False  # set by fetch_orders_html(conditional=True)
+        self.orders_frame: Optional[pd.DataFrame] = None  # set by start_session(stream=True) on a cache hit
+        self.streamed: Optional[StreamResult] = None  # set by scrape_and_save / start_session(stream=True, save=True)
+        self._encodings: Dict[str, str] = {}  # host -> last declared charset, for fetch_orders_table
+        self._session_cookies: set = set()  # session cookie names expected to stay set while logged in
+        self.metrics = RUN_METRICS
 
+    @_timed("start_session")
+    def start_session(self, conditional: bool = False, stream: bool = False, save: bool = False) -> Optional[str]:
+        """Authenticate, reusing cached cookies when they are still accepted.
+
+        On a cache hit the Orders page fetched to validate the session is returned so the
+        caller does not request it twice; otherwise a full login() runs and None is returned.
+        With conditional=True the validating fetch is conditional too: check
+        orders_unchanged before treating None as "not fetched yet". With stream=True it goes
+        through fetch_orders_table instead and the parsed table lands in orders_frame; with
+        save=True as well it goes through stream_outputs and the result lands in streamed.
+        """
+        cache = self.session_cache
+        if cache is not None and cache.load(self.sess.cookies):
+            self._session_cookies = session_cookie_names(self.sess.cookies)
+            try:
+                if stream and save:
+                    self.streamed = self.stream_outputs()
+                    html = None
+                elif stream:
+                    self.orders_frame = self.fetch_orders_table()
+                    html = None
+                else:
+                    html = self.fetch_orders_html(conditional=conditional)
+            except PermissionError:
+                self.sess.cookies.clear()
+                self._session_cookies = set()
+            else:
+                cache.hits += 1
+                cache.save(self.sess.cookies)
+                return html
+        if cache is not None:
+            cache.misses += 1
+        self.login()
+        if cache is not None:
+            cache.save(self.sess.cookies)
+        return None
+
+    @_timed("login")
     def login(self) -> None:
         """Perform login using the form fields: email, password, action=signin."""
         # Get landing page first (cookies, any hidden form bits if needed later)
         try:
-            r0 = self.sess.get(self.cfg.base_url, timeout=self.cfg.timeout)
+            r0 = self.sess.get(self.cfg.base_url, timeout=self.cfg.timeouts)
             r0.raise_for_status()
         except Exception as e:
             raise RuntimeError(f"Failed initial GET to base URL: {e}")
+        self.metrics.add("bytes_downloaded", _wire_bytes(r0))
 
         payload = {
             "email": self.cfg.email,
@@ -92,117 +2607,1385 @@ class YBSNowScraper:
             "action": "signin",
         }
         try:
-            r = self.sess.post(self.cfg.login_url, data=payload, timeout=self.cfg.timeout)
+            r = self.sess.post(self.cfg.login_url, data=payload, timeout=self.cfg.timeouts)
             r.raise_for_status()
         except Exception as e:
             raise RuntimeError(f"Login POST failed: {e}")
+        self.metrics.add("bytes_downloaded", _wire_bytes(r))
 
         # Basic sanity check: after login, ensure we're not still on the login form.
-        if self._looks_like_login_page(r.text):
+        if self._looks_like_login_page(r.content):
             raise PermissionError("Login appears to have failed — still seeing the sign-in form.")
+        self._session_cookies = session_cookie_names(self.sess.cookies)
 
-    def _looks_like_login_page(self, html: str) -> bool:
-        soup = BeautifulSoup(html, "lxml")
-        form = soup.find("form", attrs={"name": "signin", "id": "signin"})
+    def _looks_like_login_page(self, html: Union[str, bytes]) -> bool:
         # Heuristic: if the sign-in form is present, assume not logged in.
-        return form is not None
+        if isinstance(html, OrdersPage):
+            return html.login_form  # answered from the tree the table will be read from
+        return looks_like_login_page(html)
+
+    def _may_be_logged_out(self, r) -> bool:
+        """Header-only hints that the session may be gone: redirected to the login URL, or
+        a session-looking cookie that login (or the cookie cache) had set disappeared.
+
+        Only a reason to look at the body (_check_session): one-shot cookies such as a
+        CSRF token or flash message also match _SESSION_COOKIE_RE and come and go.
+        """
+        if r.history and _same_page(r.url, self.cfg.login_url):
+            return True
+        return bool(self._session_cookies - session_cookie_names(self.sess.cookies))
+
+    def _check_session(self, r, what: str = "Orders page") -> None:
+        """Raise PermissionError if a hinted-at response (_may_be_logged_out) is the sign-in page."""
+        if not self._may_be_logged_out(r):
+            return
+        if self._looks_like_login_page(r.content):
+            raise PermissionError(f"Session not authenticated when fetching {what}. Check credentials or URL.")
+        # Still logged in: whatever cookie went away was not the session's.
+        self._session_cookies &= session_cookie_names(self.sess.cookies)
+
+    @_timed("fetch_orders_html")
+    def fetch_orders_html(self, conditional: bool = False) -> Optional[OrdersPage]:
+        """GET the Orders page as an OrdersPage (a str, so callers wanting raw HTML still work).
+
+        When a change tracker is configured, each response's validators and table hash are
+        staged for ChangeTracker.commit(). With conditional=True the stored validators are
+        sent as well, and None is returned (with orders_unchanged set) if the server answers
+        304 or the orders table hashes the same as last time.
+        """
+        self.orders_unchanged = False
+        tracker = self.change_tracker
+        if tracker is None:
+            return self._fetch_page(self.cfg.orders_url)
+        r = self._get(self.cfg.orders_url, tracker.request_headers() if conditional else None)
+        if r.status_code == 304:
+            tracker.not_modified()
+            self.orders_unchanged = True
+            return None
+        page = self._page(r)
+        if not tracker.observe(r.headers, page, conditional) and conditional:
+            self.orders_unchanged = True
+            return None
+        return page
+
+    @contextmanager
+    def _orders_stream(self, url: Optional[str] = None):
+        """Streamed GET of an Orders page, shared by fetch_orders_table and iter_orders_batches.
+
+        Yields (response, chunks, encoding, page). chunks reads the (gzip/br-compressed)
+        body in cfg.stream_chunk_size pieces, to be decoded with ``encoding``: the declared
+        charset (Content-Type, else <meta>) or the one last declared by this host, so
+        nothing is guessed. Every piece is also spooled (in memory up to
+        STREAM_SPOOL_BYTES, then on disk) so page() can return the whole OrdersPage,
+        rendered if needed, for pages that need the fallback parsers.
+        """
+        import itertools
+        import tempfile
+
+        url = url or self.cfg.orders_url
+        try:
+            r = self.sess.get(url, stream=True, timeout=self.cfg.timeouts)
+            r.raise_for_status()
+        except Exception as e:
+            raise RuntimeError(f"Failed to GET Orders URL: {e}")
+
+        # No header check here: the extractor spots the sign-in form as the body streams past.
+        host = urlsplit(r.url).netloc
+        with r, tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_BYTES) as spool:
+            body = r.iter_content(self.cfg.stream_chunk_size)
+            head = next(body, b"")
+            declared = declared_encoding(r.headers.get("Content-Type"), head)
+            if declared:
+                self._encodings[host] = declared
+            encoding = declared or self._encodings.get(host, "utf-8")
+
+            def chunks():
+                for chunk in itertools.chain([head], body):
+                    spool.write(chunk)
+                    yield chunk
+
+            def page() -> OrdersPage:
+                for chunk in body:  # the fallback parsers need the whole page
+                    spool.write(chunk)
+                spool.seek(0)
+                return self._render_if_needed(OrdersPage(spool.read().decode(encoding, errors="replace"), r.url))
+
+            try:
+                yield r, chunks(), encoding, page
+            finally:
+                self.metrics.add("bytes_downloaded", _wire_bytes(r))
+
+    @_timed("fetch_orders_table")
+    def fetch_orders_table(self, url: Optional[str] = None) -> pd.DataFrame:
+        """Streaming fetch + parse of one Orders page that never holds the page as one string.
+
+        The body is fed straight into OrdersTableExtractor as it downloads (_orders_stream);
+        pages that need the read_html fallback are parsed from the spooled copy. Returns
+        the whole table; stream_outputs writes it out batch by batch instead.
+        """
+        with self._orders_stream(url) as (r, chunks, encoding, page):
+            extractor = OrdersTableExtractor()
+            df = extractor.extract_chunks(chunks, encoding)
+            if extractor.login_form:
+                raise PermissionError("Session not authenticated when fetching Orders page. Check credentials or URL.")
+            if df is not None:
+                if self.cfg.details:
+                    self._add_detail_links(df, extractor.links, r.url)
+                return self._clean_df(df)
+            html = page()
+        return self.parse_orders_table(html)
+
+    def iter_orders_batches(
+        self, url: Optional[str] = None, drain: Optional[Callable[[], None]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream one Orders page as cleaned batches of at most cfg.stream_batch_rows rows.
+
+        Rows are parsed from the response as it downloads and cleaned a batch at a time
+        (BatchCleaner), so memory is bounded by the batch size, not the table. A table
+        that can't be streamed losslessly raises StreamFallback carrying the whole page
+        for parse_orders_table -- also when the consumer throws one in at a yield, or
+        when ``drain`` (called after the last batch, while the page is still at hand)
+        raises one.
+        """
+        with self._orders_stream(url) as (r, chunks, encoding, page):
+            extractor = OrdersTableExtractor()
+            cleaner = BatchCleaner(self.cfg)
+            try:
+                for raw in extractor.iter_frames(chunks, encoding, self.cfg.stream_batch_rows):
+                    with self.metrics.stage("clean_df"):
+                        batch = cleaner.clean(raw)
+                    yield batch
+                if drain is not None and not extractor.login_form:
+                    drain()
+            except StreamFallback as e:
+                if not extractor.login_form:
+                    raise StreamFallback(str(e), page()) from None
+            if extractor.login_form:
+                raise PermissionError("Session not authenticated when fetching Orders page. Check credentials or URL.")
+
+    @property
+    def streams_outputs(self) -> bool:
+        """Whether stream_outputs can write every configured output batch by batch.
+
+        SQLite upsert/history modes diff against the whole table, merged batch output
+        replaces rows per source, and --details needs every row's link.
+        """
+        cfg = self.cfg
+        sqlite_ok = "sqlite" not in cfg.formats or (cfg.db_mode == "replace" and not cfg.history)
+        return cfg.stream and sqlite_ok and not cfg.source_column and not cfg.details
+
+    @_timed("stream_outputs")
+    def stream_outputs(self, url: Optional[str] = None) -> StreamResult:
+        """Fetch, parse, clean and save one Orders page batch by batch, in constant memory.
+
+        Each batch from iter_orders_batches goes to every format in cfg.formats, each
+        written on its own thread (_SinkWriter): CSV and JSONL are appended, Parquet gets
+        a row group, SQLite an executemany into a staging table, XLSX write-only rows.
+        Files are renamed into place (and the SQLite table swapped in) only once the whole
+        page is through. A page that can't be streamed is parsed whole and saved with
+        save_outputs. Check streams_outputs first, or use scrape_and_save.
+        """
+        compression = None if self.cfg.parquet_compression == "none" else self.cfg.parquet_compression
+        sink_types = {
+            "csv": lambda: CsvSink(self.cfg.out_csv),
+            "xlsx": lambda: XlsxSink(self.cfg.out_xlsx),
+            "sqlite": lambda: SqliteSink(self.cfg.out_db),
+            "parquet": lambda: ParquetSink(self.cfg.out_parquet, compression, self.cfg.string_storage),
+            "jsonl": lambda: JsonlSink(self.cfg.out_jsonl),
+        }
+        sinks = {f: sink_types[f]() for f in OUTPUT_FORMATS if f in self.cfg.formats}
+        writers = [_SinkWriter(fmt, sink, self.metrics) for fmt, sink in sinks.items()]
+
+        def check() -> None:
+            error = next((w.error for w in writers if w.error is not None), None)
+            if error is not None:
+                raise error
+
+        def drain() -> None:
+            for w in writers:
+                w.wait()
+            check()
+
+        def finish(abort: bool = False) -> None:
+            for w in writers:
+                w.finish(abort)
+            for w in writers:
+                w.join()
+
+        batches = self.iter_orders_batches(url, drain)
+        rows, preview = 0, None
+        try:
+            for batch in batches:
+                if preview is None:
+                    preview = batch.head(PREVIEW_ROWS)
+                try:
+                    check()
+                except StreamFallback as e:
+                    batches.throw(e)  # comes back out with the whole page attached
+                for w in writers:
+                    w.put(batch)
+                rows += len(batch)
+            finish()
+            check()
+            paths = {w.fmt: w.path for w in writers}
+        except StreamFallback as e:
+            finish(abort=True)
+            df = self.parse_orders_table(e.page)
+            return StreamResult(self.save_outputs(df), len(df), list(df.columns), df.head(PREVIEW_ROWS))
+        except BaseException:
+            batches.close()
+            finish(abort=True)
+            raise
+        return StreamResult(paths, rows, list(preview.columns), preview)
+
+    def scrape_and_save(self) -> pd.DataFrame:
+        """Fetch, parse and save the Orders page; returns its first PREVIEW_ROWS rows.
+
+        Streams into the outputs when streams_outputs allows it, otherwise parses the
+        whole table and saves it with save_outputs. Either way the row count, columns and
+        paths land in streamed.
+        """
+        if self.streams_outputs:
+            self.streamed = self.stream_outputs()
+        else:
+            df = self.parse_orders_table(self.fetch_orders_html())
+            self.streamed = StreamResult(self.save_outputs(df), len(df), list(df.columns), df.head(PREVIEW_ROWS))
+        return self.streamed.preview
 
-    def fetch_orders_html(self) -> str:
+    def _get(self, url: str, headers: Optional[dict] = None):
         try:
-            r = self.sess.get(self.cfg.orders_url, timeout=self.cfg.timeout)
+            r = self.sess.get(url, headers=headers, timeout=self.cfg.timeouts)
             r.raise_for_status()
         except Exception as e:
             raise RuntimeError(f"Failed to GET Orders URL: {e}")
+        self.metrics.add("bytes_downloaded", _wire_bytes(r))
 
-        if self._looks_like_login_page(r.text):
+        if r.status_code != 304:
+            self._check_session(r)
+
+        return r
+
+    def _page(self, r, render: bool = True) -> OrdersPage:
+        """r's body as an OrdersPage; ``render`` only for Orders listing pages, never detail pages."""
+        page = OrdersPage(r.text, r.url)
+        if self._looks_like_login_page(page):
             raise PermissionError("Session not authenticated when fetching Orders page. Check credentials or URL.")
+        return self._render_if_needed(page) if render else page
 
-        return r.text
+    def _render_if_needed(self, page: OrdersPage, jar=None) -> OrdersPage:
+        """With cfg.renderer, re-fetch a page whose static HTML has no orders table in a
+        headless browser carrying this session's cookies (or ``jar``)."""
+        if not self.cfg.renderer or page.has_orders_table():
+            return page
+        url = page.url or self.cfg.orders_url
+        rendered = OrdersPage(get_renderer(self.cfg).render(url, self.sess.cookies if jar is None else jar), url)
+        if self._looks_like_login_page(rendered):
+            raise PermissionError("Session not authenticated when fetching Orders page. Check credentials or URL.")
+        return rendered
 
-    def parse_orders_table(self, html: str) -> pd.DataFrame:
-        """Try a few strategies to extract the orders table into a DataFrame.
-        1) If a specific id/class is known, target it (adjust SELECTORS).
-        2) Else, fall back to pandas.read_html and pick the most relevant table.
+    def _fetch_page(self, url: str, render: bool = True) -> OrdersPage:
+        return self._page(self._get(url), render)
+
+    def _fetch_page_with_retry(self, url: str, render: bool = True) -> OrdersPage:
+        attempt = 0
+        while True:
+            try:
+                return self._fetch_page(url, render)
+            except RuntimeError:
+                if attempt >= self.cfg.page_retries:
+                    raise
+                attempt += 1
+                time.sleep(backoff_delay(self.cfg, attempt))
+
+    @_timed("fetch_orders_json")
+    def fetch_orders_json(self, html: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Discovery mode: load the orders from JSON behind the Orders page, not its HTML table.
+
+        Inline payloads are tried first (no extra request), then each endpoint found by
+        discover_json_sources is fetched over the logged-in session. The record list that
+        scores best with score_rows (then has most rows) wins if it scores above zero; pages it
+        advertises (page count or next link) are fetched too, numbered ones concurrently,
+        each retried like a listing page. Returns None when nothing qualifies or a page of
+        the winning listing can't be fetched, so the caller can parse the table instead.
+        A PermissionError from an endpoint stops the candidates there rather than ending
+        the run.
         """
-        soup = BeautifulSoup(html, "lxml")
+        page = OrdersPage.of(html if html is not None else self.fetch_orders_html())
+        url = page.url or self.cfg.orders_url
+        table = page.selector_table()
+        if table is None:
+            table = pick_orders_table(page)
+        header = table_sample(table, 0)[0] if table is not None else None
+        payloads, endpoints = discover_json_sources(page, url)
+        best_key, best_df, source, source_data = (1, 0), None, None, None
+        for data in payloads:
+            df, score = json_records_frame(data, header)
+            if df is not None and (score, len(df)) >= best_key:
+                best_key, best_df, source, source_data = (score, len(df)), df, None, data
+        for endpoint in endpoints:
+            try:
+                data = self._get_json(endpoint)
+            except PermissionError as e:
+                print(f"[!] JSON discovery stopped at {endpoint}: {e}")
+                break  # the session is gone; every other candidate would fail the same way
+            except RuntimeError:
+                continue
+            df, score = json_records_frame(data, header)
+            if df is not None and (score, len(df)) > best_key:
+                best_key, best_df, source, source_data = (score, len(df)), df, endpoint, data
+        if best_df is None:
+            return None
+        if source is not None:
+            try:
+                best_df = self._json_remaining_pages(source, source_data, best_df, header)
+            except (RuntimeError, PermissionError) as e:
+                print(f"[!] JSON listing {source}: {e}")
+                return None
+        return self._clean_df(best_df)
 
-        # === Strategy 1: Known selectors (adjust to your DOM) ===
-        SELECTORS = [
-            {"name": "table", "attrs": {"id": "orders"}},
-            {"name": "table", "attrs": {"class": "orders"}},
-            {"name": "table", "attrs": {"class": "table table-striped"}},
-        ]
-        for sel in SELECTORS:
-            table = soup.find(sel["name"], attrs=sel["attrs"])  # type: ignore
-            if table:
-                df_list = pd.read_html(str(table))
-                if df_list:
-                    df = df_list[0]
-                    return self._clean_df(df)
+    @_timed("crawl_order_details")
+    def crawl_order_details(self, df: pd.DataFrame) -> dict:
+        """Fetch each row's detail page and store its line items in cfg.out_db's order_items.
+
+        Needs the DETAIL_URL_COLUMN added by parse_orders_table with cfg.details. Pages are
+        fetched on a pool of cfg.detail_workers, at most cfg.detail_rate per second per
+        host, each URL once. A page is skipped when its orders row hashes the same as when
+        it was last crawled. Items carry the detail URL and the order key, in place of any
+        item columns of the same name. Raises ValueError, before fetching anything, if
+        cfg.db_key is not a column of df. Returns {"fetched", "skipped", "failed", "items"}
+        counts.
+        """
+        import sqlite3
+        from concurrent.futures import ThreadPoolExecutor
+
+        counts = {"fetched": 0, "skipped": 0, "failed": 0, "items": 0}
+        if DETAIL_URL_COLUMN not in df.columns:
+            return counts
+        key = self.cfg.db_key or detect_order_key(df.columns)
+        if key and key not in df.columns:
+            raise ValueError(f"Order key column {key!r} not found in Orders table; check --db-key.")
+        todo: Dict[str, Tuple[str, object]] = {}  # url -> (row hash, order key value)
+        conn = sqlite3.connect(self.cfg.out_db)
+        try:
+            seen = load_detail_hashes(conn)
+            for url, row_hash, order in zip(
+                df[DETAIL_URL_COLUMN], order_row_hashes(df), df[key] if key else [None] * len(df)
+            ):
+                if pd.isna(url) or url in todo:
+                    continue
+                if seen.get(url) == row_hash:
+                    counts["skipped"] += 1
+                    continue
+                todo[url] = (row_hash, order)
+
+            limiter = HostRateLimiter(self.cfg.detail_rate)
 
-        # === Strategy 2: Any HTML tables via pandas ===
+            def fetch(url: str) -> Optional[pd.DataFrame]:
+                limiter.wait(url)
+                try:
+                    return self._parse_items(self._fetch_page_with_retry(url, render=False))
+                except (RuntimeError, ValueError) as e:
+                    print(f"[!] Detail page {url}: {e}")
+                    return None
+
+            parts: List[pd.DataFrame] = []
+            hashes: Dict[str, str] = {}
+            with ThreadPoolExecutor(max_workers=max(1, self.cfg.detail_workers)) as pool:
+                for url, items in zip(todo, pool.map(fetch, todo)):
+                    if items is None:
+                        counts["failed"] += 1
+                        continue
+                    counts["fetched"] += 1
+                    hashes[url] = todo[url][0]
+                    if items.empty:
+                        continue
+                    for name, value in ((DETAIL_URL_COLUMN, url), (key, todo[url][1])):
+                        if name:
+                            # The crawl's value links items to orders, so it replaces a same-named item column.
+                            items = items.drop(columns=name, errors="ignore")
+                            items.insert(0, name, value)
+                    parts.append(items)
+            items = concat_order_frames(parts) if parts else pd.DataFrame()
+            counts["items"] = len(items)
+            if hashes:
+                store_order_items(conn, items, hashes)
+        finally:
+            conn.close()
+        return counts
+
+    def _parse_items(self, page: OrdersPage) -> pd.DataFrame:
+        table = pick_items_table(page)
+        if table is None:
+            return pd.DataFrame()
+        df = self._read_table(page, table)
+        return pd.DataFrame() if df is None else self._clean_df(df)
+
+    def _get_json(self, url: str):
+        try:
+            r = self.sess.get(url, headers=JSON_REQUEST_HEADERS, timeout=self.cfg.timeouts)
+            r.raise_for_status()
+        except Exception as e:
+            raise RuntimeError(f"Failed to GET {url}: {e}")
+        self.metrics.add("bytes_downloaded", _wire_bytes(r))
+        self._check_session(r, "Orders data")
         try:
-            tables = pd.read_html(html)
+            return r.json()
         except ValueError:
-            tables = []
+            raise RuntimeError(f"{url} did not return JSON")
 
-        # Heuristic to choose best table: look for columns that match common fields
-        preferred_cols = [
-            "Order", "Order #", "Order ID", "PO", "Customer", "Workstation", "Status", "Date", "Due"
-        ]
-        best_idx = None
-        best_score = -1
-        for i, df in enumerate(tables):
-            score = sum(1 for c in df.columns if any(pc.lower() in str(c).lower() for pc in preferred_cols))
-            if score > best_score and len(df.columns) > 1 and len(df) > 0:
-                best_score = score
-                best_idx = i
-        if best_idx is None:
-            if not tables:
-                raise ValueError("No HTML tables found on Orders page.")
-            df = tables[0]
+    def _get_json_with_retry(self, url: str):
+        attempt = 0
+        while True:
+            try:
+                return self._get_json(url)
+            except RuntimeError:
+                if attempt >= self.cfg.page_retries:
+                    raise
+                attempt += 1
+                time.sleep(backoff_delay(self.cfg, attempt))
+
+    def _json_remaining_pages(self, url: str, data, first: pd.DataFrame, header: Optional[List[str]]) -> pd.DataFrame:
+        """The rest of a paginated JSON listing after its first page. Each page is retried
+        cfg.page_retries times; a page that still fails raises, as a partial listing would
+        silently drop orders."""
+        param, count, next_url = json_pagination(data, url)
+        frames = [first]
+        if count > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            urls = [_set_query_param(url, param, n) for n in range(2, min(count, self.cfg.max_pages) + 1)]
+            with ThreadPoolExecutor(max_workers=max(1, self.cfg.page_workers)) as pool:
+                frames.extend(json_records_frame(d, header)[0] for d in pool.map(self._get_json_with_retry, urls))
+        else:
+            seen = {url}
+            while next_url and next_url not in seen and len(frames) < self.cfg.max_pages:
+                seen.add(next_url)
+                data = self._get_json_with_retry(next_url)
+                frames.append(json_records_frame(data, header)[0])
+                _, _, next_url = json_pagination(data, next_url)
+        frames = [f for f in frames if f is not None and not f.empty]
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else first
+
+    def _fetch_and_parse_page(self, url: str, want_links: bool = False) -> Tuple[pd.DataFrame, dict]:
+        """Fetch + parse one listing page, retrying transient failures with backoff.
+
+        Returns the page's rows and, if want_links, its numbered pagination links.
+        """
+        html = self._fetch_page_with_retry(url)
+        links = discover_page_links(html, url)[1] if want_links else {}
+        try:
+            return self.parse_orders_table(html), links
+        except ValueError:
+            return pd.DataFrame(), links  # past the last page: no table
+
+    @_timed("fetch_all_orders")
+    def fetch_all_orders(self, first_html: Optional[str] = None) -> pd.DataFrame:
+        """Fetch every page of the Orders listing and return one DataFrame in page order.
+
+        Numbered page links (?page=N and friends) are fetched concurrently on a bounded
+        pool; each round re-scans the highest page fetched so sliding pagination windows
+        ("1 2 3 ... 10 »") are followed to the end. Listings that only offer a "Next"
+        link are walked sequentially. Pass first_html if page 1 was already fetched.
+        """
+        first_url = self.cfg.orders_url
+        if first_html is None:
+            first_html = self.fetch_orders_html()
+        first_html = OrdersPage.of(first_html)
+        frames = {1: self.parse_orders_table(first_html)}
+        param, links, next_url = discover_page_links(first_html, first_url)
+
+        if param is None:
+            seen = {first_url}
+            page = 1
+            while next_url and next_url not in seen and page < self.cfg.max_pages:
+                seen.add(next_url)
+                page += 1
+                html = self._fetch_page_with_retry(next_url)
+                try:
+                    frames[page] = self.parse_orders_table(html)
+                except ValueError:
+                    break
+                _, _, next_url = discover_page_links(html, next_url)
         else:
-            df = tables[best_idx]
+            template = links[max(links)]
+            last_known = max(links)
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=max(1, self.cfg.page_workers)) as pool:
+                while True:
+                    todo = [n for n in range(2, min(last_known, self.cfg.max_pages) + 1) if n not in frames]
+                    if not todo:
+                        break
+                    urls = [links.get(n) or _set_query_param(template, param, n) for n in todo]
+                    # Only the furthest page is re-scanned for links beyond the visible window.
+                    want = [n == todo[-1] for n in todo]
+                    for n, (df, more) in zip(todo, pool.map(self._fetch_and_parse_page, urls, want)):
+                        frames[n] = df
+                        links.update(more)
+                    if max(links) <= last_known:
+                        break
+                    last_known = max(links)
+
+        parts = [frames[n] for n in sorted(frames) if not frames[n].empty]
+        if not parts:
+            return frames[1]
+        return concat_order_frames(parts)
+
+    @_timed("parse_orders_table")
+    def parse_orders_table(self, html: str) -> pd.DataFrame:
+        """Try a few strategies to extract the orders table into a DataFrame.
+        1) Walk the table matching ORDERS_TABLE_SELECTORS in the page's lxml tree.
+        2) If that table uses features the fast path skips (rowspan, multi-row headers),
+           hand just that table to pandas.read_html.
+        3) Else, read the table learned for this orders URL by an earlier fallback, if its
+           columns still match, or fall back to pandas.read_html and pick the most
+           relevant table (remembering where it was for next time).
+        Every step shares one tree: an OrdersPage from fetch_orders_html arrives already
+        parsed if its auth check or pagination scan needed it; plain HTML is parsed once here.
+        """
+        page = OrdersPage.of(html)
+        df = page.extract_table()
+        if df is None:
+            df = self._parse_selected_table(page)
+        if df is None:
+            df = self._pick_best_table(page)
+        if self.cfg.details and page.table is not None:
+            self._add_detail_links(df, row_links(page.table), page.url)
         return self._clean_df(df)
 
+    def _add_detail_links(self, df: pd.DataFrame, links: List[Optional[str]], page_url: str) -> None:
+        """Add DETAIL_URL_COLUMN (absolute URLs) if there is one link slot per parsed row."""
+        if len(links) != len(df):
+            return
+        base = page_url or self.cfg.orders_url
+        df[DETAIL_URL_COLUMN] = [
+            urljoin(base, h) if h and not h.startswith(("#", "javascript:", "mailto:")) else None for h in links
+        ]
+
+    def _parse_selected_table(self, html: str) -> Optional[pd.DataFrame]:
+        """Selector path via pandas.read_html, given only the matched table's markup."""
+        page = OrdersPage.of(html)
+        table = page.selector_table()
+        if table is None:
+            return None
+        page.table = table
+        df_list = pd.read_html(StringIO(page.table_html(table)))
+        return df_list[0] if df_list else None
+
+    def _pick_best_table(self, html: str) -> pd.DataFrame:
+        """Pick the most relevant table with score_table and read just that one with pandas.read_html.
+
+        With a selector cache, a table learned for cfg.orders_url is tried first.
+        """
+        page = OrdersPage.of(html)
+        cache = self.selector_cache
+        if cache is not None:
+            df = cache.lookup(self.cfg.orders_url, page)
+            if df is not None:
+                return df
+        table = pick_orders_table(page)
+        if table is not None:
+            df = self._read_table(page, table)
+            if df is not None:
+                page.table = table
+                if cache is not None:
+                    cache.learn(self.cfg.orders_url, table, df)
+                return df
+        # Nothing data-like: take the first table read_html can make sense of.
+        for table in page.tree.iter("table"):
+            df = self._read_table(page, table)
+            if df is not None:
+                page.table = table
+                return df
+        raise ValueError("No HTML tables found on Orders page.")
+
+    @staticmethod
+    def _read_table(page: OrdersPage, table) -> Optional[pd.DataFrame]:
+        try:
+            return pd.read_html(StringIO(page.table_html(table)))[0]
+        except (ValueError, IndexError):
+            return None
+
+    @_timed("clean_df")
+    @property
+    def _sqlite_keeps_text(self) -> bool:
+        """Whether the SQLite output compares rows across runs (upsert, history).
+
+        A column's inferred type depends on the other rows of the page (one "TBD" keeps a
+        date column as text), so those modes store and hash scraped_text; _clean_df then
+        leaves the columns as text and save_outputs types them for the other formats.
+        """
+        cfg = self.cfg
+        return "sqlite" in cfg.formats and (cfg.db_mode == "upsert" or cfg.history)
+
     def _clean_df(self, df: pd.DataFrame) -> pd.DataFrame:
         # Normalize column names
         df.columns = [str(c).strip().replace("\n", " ") for c in df.columns]
+        # Strip whitespace in string cells (blanks become missing), then type the columns
+        if self.cfg.typed_columns and not self._sqlite_keeps_text:
+            df = infer_order_dtypes(df, self.cfg.string_storage)
+        else:
+            df = normalize_text_columns(df, self.cfg.string_storage)
         # Drop completely empty columns
-        df = df.dropna(axis=1, how="all")
-        # Strip whitespace in string cells
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.strip()
-        return df
+        return df.dropna(axis=1, how="all")
+
+    def _order_key(self, df: pd.DataFrame) -> str:
+        key = self.cfg.db_key or detect_order_key(df.columns)
+        if not key:
+            raise ValueError("No order key column found; pass --db-key.")
+        return key
+
+    def _db_key(self, df: pd.DataFrame) -> Union[str, List[str]]:
+        """SQLite key: the order key, prefixed by the source column in merged batch output."""
+        key = self._order_key(df)
+        return [self.cfg.source_column, key] if self.cfg.source_column else key
+
+    @_timed("save_outputs")
+    def save_outputs(self, df: pd.DataFrame) -> Dict[str, str]:
+        """Write df in every format listed in cfg.formats; returns {format: absolute path}.
+
+        Writers run concurrently on a thread pool. File outputs are written to a temp file
+        and renamed into place; SQLite relies on its own transactions. Formats that are not
+        selected are never touched (openpyxl is only imported by the XLSX writer). With
+        _sqlite_keeps_text, df is untyped: SQLite gets its scraped_text, the files a typed copy.
+        """
+        frames = dict.fromkeys(OUTPUT_FORMATS, df)
+        if self._sqlite_keeps_text:
+            if self.cfg.typed_columns:
+                frames = dict.fromkeys(OUTPUT_FORMATS, infer_order_dtypes(df, self.cfg.string_storage))
+            frames["sqlite"] = scraped_text(df)
+        writers: Dict[str, Callable[[pd.DataFrame], str]] = {
+            "csv": self._write_csv,
+            "xlsx": self._write_xlsx,
+            "sqlite": self._write_sqlite,
+            "parquet": self._write_parquet,
+            "jsonl": self._write_jsonl,
+        }
+        selected = [f for f in OUTPUT_FORMATS if f in self.cfg.formats]
+        if len(selected) <= 1:
+            return {f: writers[f](frames[f]) for f in selected}
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=len(selected)) as pool:
+            futures = {f: pool.submit(writers[f], frames[f]) for f in selected}
+            return {f: fut.result() for f, fut in futures.items()}
+
+    @_timed("write_csv")
+    def _write_csv(self, df: pd.DataFrame) -> str:
+        return _atomic_write(self.cfg.out_csv, lambda tmp: df.to_csv(tmp, index=False))
+
+    @_timed("write_xlsx")
+    def _write_xlsx(self, df: pd.DataFrame) -> str:
+        return _atomic_write(self.cfg.out_xlsx, lambda tmp: df.to_excel(tmp, index=False))
 
-    def save_outputs(self, df: pd.DataFrame) -> Tuple[str, str, str]:
-        df.to_csv(self.cfg.out_csv, index=False)
-        df.to_excel(self.cfg.out_xlsx, index=False)
+    @_timed("write_parquet")
+    def _write_parquet(self, df: pd.DataFrame) -> str:
+        """Typed Parquet: real dates/numbers, dictionary-encoded categoricals, zstd by default."""
+        import pyarrow as pa  # optional dependency, only needed for parquet output
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(infer_order_dtypes(df, self.cfg.string_storage), preserve_index=False)
+        compression = None if self.cfg.parquet_compression == "none" else self.cfg.parquet_compression
+        return _atomic_write(
+            self.cfg.out_parquet,
+            lambda tmp: pq.write_table(table, tmp, compression=compression, use_dictionary=True),
+        )
+
+    @_timed("write_jsonl")
+    def _write_jsonl(self, df: pd.DataFrame) -> str:
+        return _atomic_write(
+            self.cfg.out_jsonl,
+            lambda tmp: df.to_json(tmp, orient="records", lines=True, date_format="iso", force_ascii=False),
+        )
+
+    @_timed("write_sqlite")
+    def _write_sqlite(self, df: pd.DataFrame) -> str:
         import sqlite3
         conn = sqlite3.connect(self.cfg.out_db)
-        df.to_sql("orders", conn, if_exists="replace", index=False)
-        conn.close()
-        return (
-            os.path.abspath(self.cfg.out_csv),
-            os.path.abspath(self.cfg.out_xlsx),
-            os.path.abspath(self.cfg.out_db),
+        try:
+            if self.cfg.db_mode == "upsert":
+                if self.cfg.source_column:
+                    check_source_rows(conn, self.cfg.source_column)
+                self.upsert_counts = upsert_orders(conn, df, self._db_key(df))
+            elif self.cfg.source_column:
+                # Merged batch output: only the sources present in df are replaced.
+                replace_source_rows(conn, df, self.cfg.source_column)
+            else:
+                # Build the new table aside and swap it in, so readers never see a half-written one.
+                df.to_sql("_orders_new", conn, if_exists="replace", index=False)
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("DROP TABLE IF EXISTS orders")
+                    conn.execute("ALTER TABLE _orders_new RENAME TO orders")
+            if self.cfg.history:
+                self.history_counts = record_order_history(conn, df, self._db_key(df))
+        finally:
+            conn.close()
+        return os.path.abspath(self.cfg.out_db)
+
+
+# -------------------------- Async engine ---------------------------
+
+def _parse_orders_html(cfg: ScrapeConfig, html: str) -> pd.DataFrame:
+    """Process-pool entry point: parse one Orders page with the sync scraper's parser."""
+    return YBSNowScraper(cfg).parse_orders_table(html)
+
+
+class AsyncYBSNowScraper:
+    """asyncio counterpart of YBSNowScraper built on httpx.AsyncClient.
+
+    Same login / fetch_orders_html / parse_orders_table / save_outputs contract, as
+    coroutines. One pooled keep-alive client serves every request, at most
+    ``cfg.async_concurrency`` at a time. Everything that touches lxml (login checks,
+    pagination scans, parsing) and writing run through ``_run`` on a thread pool, with
+    table parsing on a process pool when ``cfg.parse_processes`` > 0, so the loop never blocks.
+
+        async with AsyncYBSNowScraper(cfg) as scraper:
+            await scraper.login()
+            df = await scraper.parse_orders_table(await scraper.fetch_orders_html())
+    """
+
+    def __init__(self, cfg: ScrapeConfig):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        import httpx  # optional dependency, only needed for --engine async
+
+        self.cfg = cfg
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Referer": cfg.base_url},
+            # The transport retries failed connects; _get adds backoff for GET statuses/timeouts.
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=cfg.async_concurrency,
+                    max_keepalive_connections=cfg.async_concurrency,
+                ),
+                retries=cfg.http_retries,
+            ),
+            timeout=httpx.Timeout(cfg.read_timeout, connect=cfg.connect_timeout),
+            follow_redirects=True,
+        )
+        self._sem = asyncio.Semaphore(max(1, cfg.async_concurrency))
+        self.session_cache = (
+            SessionCache(cfg.session_cache_dir, cfg.base_url, cfg.email) if cfg.session_cache_dir else None
         )
+        # Parsing/saving reuse the sync implementation; its requests.Session is never used.
+        self._sync = YBSNowScraper(cfg)
+        self.metrics = RUN_METRICS
+        self._threads = ThreadPoolExecutor(max_workers=max(1, cfg.async_concurrency))
+        if cfg.parse_processes > 0:
+            self._executor = ProcessPoolExecutor(max_workers=cfg.parse_processes)
+        else:
+            self._executor = self._threads
+
+    async def __aenter__(self) -> "AsyncYBSNowScraper":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+        self._executor.shutdown(wait=False)
+        self._threads.shutdown(wait=False)
+
+    async def _run(self, fn, *args, process: bool = False):
+        """Run fn(*args) off the event loop: on the thread pool, or on the parse executor
+        (a process pool with cfg.parse_processes) when ``process`` is set."""
+        executor = self._executor if process else self._threads
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def _get(self, url: str):
+        """GET with the sync transport's retry policy: backoff + jitter, Retry-After honoured."""
+        import httpx
+
+        attempt = 0
+        while True:
+            try:
+                r = await self.client.get(url)
+            except httpx.TimeoutException:
+                if attempt >= self.cfg.http_retries:
+                    raise
+                retry_after = None
+            else:
+                if r.status_code not in RETRY_STATUSES or attempt >= self.cfg.http_retries:
+                    self.metrics.add("bytes_downloaded", _wire_bytes(r))
+                    return r
+                retry_after = r.headers.get("Retry-After")
+            attempt += 1
+            await asyncio.sleep(backoff_delay(self.cfg, attempt, retry_after))
+
+    @_timed("login")
+    async def login(self) -> None:
+        """Perform login using the form fields: email, password, action=signin."""
+        try:
+            r0 = await self._get(self.cfg.base_url)
+            r0.raise_for_status()
+        except Exception as e:
+            raise RuntimeError(f"Failed initial GET to base URL: {e}")
+
+        payload = {
+            "email": self.cfg.email,
+            "password": self.cfg.password,
+            "action": "signin",
+        }
+        try:
+            r = await self.client.post(self.cfg.login_url, data=payload)
+            r.raise_for_status()
+        except Exception as e:
+            raise RuntimeError(f"Login POST failed: {e}")
+        self.metrics.add("bytes_downloaded", _wire_bytes(r))
+
+        if await self._run(self._sync._looks_like_login_page, r.content):
+            raise PermissionError("Login appears to have failed — still seeing the sign-in form.")
+
+    @_timed("start_session")
+    async def start_session(self) -> Optional[str]:
+        """Async counterpart of YBSNowScraper.start_session (cookie cache, then login())."""
+        cache = self.session_cache
+        jar = self.client.cookies.jar
+        if cache is not None and cache.load(jar):
+            try:
+                html = await self.fetch_orders_html()
+            except PermissionError:
+                jar.clear()
+            else:
+                cache.hits += 1
+                cache.save(jar)
+                return html
+        if cache is not None:
+            cache.misses += 1
+        await self.login()
+        if cache is not None:
+            cache.save(jar)
+        return None
+
+    @_timed("fetch_orders_html")
+    async def fetch_orders_html(self, url: Optional[str] = None) -> OrdersPage:
+        async with self._sem:
+            try:
+                r = await self._get(url or self.cfg.orders_url)
+                r.raise_for_status()
+            except Exception as e:
+                raise RuntimeError(f"Failed to GET Orders URL: {e}")
+            html = OrdersPage(r.text, str(r.url))
+
+        if await self._run(self._sync._looks_like_login_page, html):
+            raise PermissionError("Session not authenticated when fetching Orders page. Check credentials or URL.")
+        if self.cfg.renderer:
+            html = await self._run(self._sync._render_if_needed, html, self.client.cookies.jar)
+        return html
+
+    async def parse_orders_table(self, html: str) -> pd.DataFrame:
+        if self.cfg.parse_processes > 0:
+            return await self._run(_parse_orders_html, self.cfg, html, process=True)
+        return await self._run(self._sync.parse_orders_table, html)
+
+    async def save_outputs(self, df: pd.DataFrame) -> Dict[str, str]:
+        return await self._run(self._sync.save_outputs, df)
+
+    async def fetch_orders_frames(self, urls: List[str]) -> List[pd.DataFrame]:
+        """Fetch and parse several Orders URLs concurrently; results keep the order of ``urls``."""
+        async def one(url: str) -> pd.DataFrame:
+            html = await self.fetch_orders_html(url)
+            try:
+                return await self.parse_orders_table(html)
+            except ValueError:
+                return pd.DataFrame()
+        return list(await asyncio.gather(*(one(u) for u in urls)))
+
+    @_timed("fetch_all_orders")
+    async def fetch_all_orders(self, first_html: Optional[str] = None) -> pd.DataFrame:
+        """Async --all-pages: numbered pages are fetched concurrently, in page order."""
+        if first_html is None:
+            first_html = await self.fetch_orders_html()
+        first_html = OrdersPage.of(first_html)
+        frames = {1: await self.parse_orders_table(first_html)}
+        param, links, next_url = await self._run(discover_page_links, first_html, self.cfg.orders_url)
+        if param is None:
+            seen = {self.cfg.orders_url}
+            while next_url and next_url not in seen and len(frames) < self.cfg.max_pages:
+                seen.add(next_url)
+                html = await self.fetch_orders_html(next_url)
+                try:
+                    frames[len(frames) + 1] = await self.parse_orders_table(html)
+                except ValueError:
+                    break
+                _, _, next_url = await self._run(discover_page_links, html, next_url)
+        else:
+            template = links[max(links)]
+            last_known = 1
+            while max(links) > last_known:
+                last_known = max(links)
+                todo = [n for n in range(2, min(last_known, self.cfg.max_pages) + 1) if n not in frames]
+                if not todo:
+                    break
+                urls = [links.get(n) or _set_query_param(template, param, n) for n in todo]
+                frames.update(zip(todo, await self.fetch_orders_frames(urls[:-1])))
+                # The furthest page is also scanned for links beyond the visible window.
+                far_html = await self.fetch_orders_html(urls[-1])
+                links.update((await self._run(discover_page_links, far_html, urls[-1]))[1])
+                try:
+                    frames[todo[-1]] = await self.parse_orders_table(far_html)
+                except ValueError:
+                    frames[todo[-1]] = pd.DataFrame()
+
+        parts = [frames[n] for n in sorted(frames) if not frames[n].empty]
+        if not parts:
+            return frames[1]
+        return concat_order_frames(parts)
+
+
+async def run_async(cfg: ScrapeConfig) -> int:
+    async with AsyncYBSNowScraper(cfg) as scraper:
+        print("[*] Logging in (async engine)...")
+        html = await scraper.start_session()
+        _report_session_cache(scraper.session_cache)
+        if cfg.all_pages:
+            print(f"[*] Fetching all Orders pages (concurrency {cfg.async_concurrency})...")
+            df = await scraper.fetch_all_orders(first_html=html)
+        else:
+            if html is None:
+                print("[*] Fetching Orders page...")
+                html = await scraper.fetch_orders_html()
+            print("[*] Parsing Orders table...")
+            df = await scraper.parse_orders_table(html)
+        scraper.metrics.add("rows_parsed", len(df))
+        print(f"[*] Parsed {len(df)} rows and {len(df.columns)} columns.")
+        paths = await scraper.save_outputs(df)
+    _report_saved(paths)
+    _report_db(scraper._sync)
+    return 0
+
+
+# ------------------------------ Batch -------------------------------
+
+# Manifest keys a target (or the manifest's "defaults") may set; outputs stay run-wide.
+BATCH_TARGET_FIELDS = (
+    "base_url", "login_url", "email", "password", "connect_timeout", "read_timeout",
+    "http_retries", "all_pages", "page_workers", "page_retries", "max_pages", "typed_columns",
+)
+SOURCE_COLUMN = "source"
+
+
+@dataclass
+class BatchTarget:
+    source: str        # label written to the source column
+    cfg: ScrapeConfig
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.cfg.orders_url).netloc.lower()
+
+
+@dataclass
+class BatchResult:
+    source: str
+    host: str
+    rows: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+
+def _read_manifest(path: str) -> dict:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".yaml", ".yml"):
+        import yaml  # optional dependency, only needed for YAML manifests
+
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f)
+    elif ext == ".toml":
+        import tomllib
+
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    elif ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        raise ValueError(f"Unsupported manifest type {ext!r}; use .yaml, .yml, .json or .toml")
+    if not isinstance(data, dict) or not isinstance(data.get("targets"), list):
+        raise ValueError(f"{path}: manifest needs a 'targets' list")
+    return data
+
+
+def _target_settings(entry: dict, where: str) -> dict:
+    settings = {}
+    for name, value in entry.items():
+        if name == "password_env":
+            value = os.getenv(value, "")
+            if not value:
+                raise ValueError(f"{where}: environment variable {entry[name]!r} is not set")
+            name = "password"
+        elif name == "timeout":  # shorthand for both, like --timeout
+            settings["connect_timeout"] = settings["read_timeout"] = value
+            continue
+        elif name not in BATCH_TARGET_FIELDS:
+            raise ValueError(
+                f"{where}: unknown key {name!r} (allowed: {', '.join(BATCH_TARGET_FIELDS)}, password_env, timeout)"
+            )
+        settings[name] = value
+    return settings
+
+
+def load_manifest(path: str, base: ScrapeConfig) -> List[BatchTarget]:
+    """Expand a batch manifest into one BatchTarget per (account, Orders URL).
+
+    The manifest has an optional "defaults" mapping and a "targets" list. Each target names
+    an account (email plus password or password_env) and either one orders_url or several
+    orders_urls (a list, or a mapping of label -> URL); any BATCH_TARGET_FIELDS override the
+    defaults, which override ``base``. Sources are labelled "name" or "name/label".
+
+        defaults: {base_url: "https://www.ybsnow.com/", all_pages: true}
+        targets:
+          - name: acme
+            email: orders@acme.example
+            password_env: ACME_PASSWORD
+            orders_urls: {open: "https://.../orders?view=open", done: "https://.../orders?view=done"}
+    """
+    data = _read_manifest(path)
+    defaults = _target_settings(data.get("defaults") or {}, f"{path}: defaults")
+    targets: List[BatchTarget] = []
+    for i, entry in enumerate(data["targets"], 1):
+        where = f"{path}: target {i}"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected a mapping")
+        entry = dict(entry)
+        name = str(entry.pop("name", "") or entry.get("email") or f"target{i}")
+        urls = entry.pop("orders_urls", None)
+        single = entry.pop("orders_url", None)
+        if urls is None and single is None:
+            raise ValueError(f"{where}: needs orders_url or orders_urls")
+        if urls is None:
+            labelled = [(name, single)]
+        elif isinstance(urls, dict):
+            labelled = [(f"{name}/{label}", url) for label, url in urls.items()]
+        else:
+            labelled = [(f"{name}/{n}", url) for n, url in enumerate(urls, 1)]
+
+        settings = {**defaults, **_target_settings(entry, where)}
+        if "base_url" in settings and "login_url" not in settings:
+            settings["login_url"] = settings["base_url"].rstrip("/") + "/" + LOGIN_PATH
+        for source, url in labelled:
+            cfg = replace(base, orders_url=url, change_state_file="", **settings)
+            if not cfg.email or not cfg.password:
+                raise ValueError(f"{where}: email and password (or password_env) are required")
+            targets.append(BatchTarget(source, cfg))
+
+    seen = set()
+    for t in targets:
+        if t.source in seen:
+            raise ValueError(f"{path}: duplicate source {t.source!r}; give targets distinct names")
+        seen.add(t.source)
+    return targets
+
+
+def scrape_orders(cfg: ScrapeConfig) -> pd.DataFrame:
+    """Log in and return the parsed Orders table for one target (batch worker entry point)."""
+    scraper = YBSNowScraper(cfg)
+    if cfg.json_discovery:
+        html = scraper.start_session() or scraper.fetch_orders_html()
+        df = scraper.fetch_orders_json(html)
+        if df is not None:
+            return df
+        return scraper.fetch_all_orders(first_html=html) if cfg.all_pages else scraper.parse_orders_table(html)
+    if cfg.all_pages:
+        return scraper.fetch_all_orders(first_html=scraper.start_session())
+    if cfg.stream:
+        scraper.start_session(stream=True)
+        return scraper.orders_frame if scraper.orders_frame is not None else scraper.fetch_orders_table()
+    html = scraper.start_session()
+    return scraper.parse_orders_table(html if html is not None else scraper.fetch_orders_html())
+
+
+def _with_source(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """df with a leading SOURCE_COLUMN. An Orders column already named that (in any case,
+    as SQLite compares column names) is kept as "<name> (orders)"."""
+    clash = {c: f"{c} (orders)" for c in df.columns if str(c).lower() == SOURCE_COLUMN}
+    if clash:
+        df = df.rename(columns=clash)
+    df.insert(0, SOURCE_COLUMN, source)
+    return df
+
+
+def _report_batch(results: List[BatchResult]) -> None:
+    width = max([len("source")] + [len(r.source) for r in results])
+    host_width = max([len("host")] + [len(r.host) for r in results])
+    print(f"{'source':<{width}}  {'host':<{host_width}}  {'status':<6}  {'rows':>7}  {'secs':>6}  error")
+    for r in results:
+        status = "FAILED" if r.error else "ok"
+        print(f"{r.source:<{width}}  {r.host:<{host_width}}  {status:<6}  {r.rows:>7}  {r.seconds:>6.1f}  {r.error}")
+    failed = sum(1 for r in results if r.error)
+    print(f"[*] Batch: {len(results) - failed}/{len(results)} targets ok, {sum(r.rows for r in results)} rows.")
+
+
+def run_batch(cfg: ScrapeConfig) -> int:
+    """Scrape every target in cfg.batch_manifest and write one merged set of outputs.
+
+    Each target gets its own YBSNowScraper session on a thread pool (or process pool with
+    cfg.batch_processes). At most cfg.batch_workers targets run at once and at most
+    cfg.batch_per_host against any one host. A failing target is reported and left out;
+    the others are still saved. Rows carry a source column, and SQLite replaces (or, with
+    --db-mode upsert, keys) rows per source so a failed target keeps its previous rows.
+    Returns 1 if any target failed.
+    """
+    from collections import Counter
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+    targets = load_manifest(cfg.batch_manifest, cfg)
+    if "sqlite" in cfg.formats and os.path.exists(cfg.out_db):
+        import sqlite3
+
+        conn = sqlite3.connect(cfg.out_db)
+        try:
+            check_source_rows(conn, SOURCE_COLUMN)  # fail before scraping, not at save time
+        finally:
+            conn.close()
+    workers = max(1, cfg.batch_workers)
+    per_host = max(1, cfg.batch_per_host)
+    kind = "processes" if cfg.batch_processes else "threads"
+    print(f"[*] Batch: {len(targets)} targets, {workers} {kind}, at most {per_host} per host...")
+
+    results = {t.source: BatchResult(t.source, t.host) for t in targets}
+    frames: List[pd.DataFrame] = []
+    pending = list(targets)
+    running = {}
+    in_flight: Counter = Counter()
+    pool_cls = ProcessPoolExecutor if cfg.batch_processes else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        while pending or running:
+            for t in list(pending):
+                if len(running) >= workers:
+                    break
+                if in_flight[t.host] < per_host:
+                    pending.remove(t)
+                    in_flight[t.host] += 1
+                    running[pool.submit(scrape_orders, t.cfg)] = (t, time.perf_counter())
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                t, t0 = running.pop(fut)
+                in_flight[t.host] -= 1
+                result = results[t.source]
+                result.seconds = time.perf_counter() - t0
+                try:
+                    df = _with_source(fut.result(), t.source)
+                except Exception as e:  # one target's failure must not sink the batch
+                    result.error = f"{type(e).__name__}: {e}"
+                    print(f"[!] {t.source}: {result.error}")
+                    continue
+                result.rows = len(df)
+                RUN_METRICS.add("rows_parsed", len(df))
+                frames.append(df)
+                print(f"[*] {t.source}: {len(df)} rows in {result.seconds:.1f}s")
+
+    if frames:
+        merged = concat_order_frames(frames)
+        merged[SOURCE_COLUMN] = merged[SOURCE_COLUMN].astype("category")
+        scraper = YBSNowScraper(replace(cfg, source_column=SOURCE_COLUMN, change_state_file=""))
+        _report_saved(scraper.save_outputs(merged))
+        _report_db(scraper)
+    _report_batch([results[t.source] for t in targets])
+    return 1 if any(r.error for r in results.values()) else 0
 
 
 # ----------------------------- CLI ---------------------------------
 
+def _report_db(scraper: YBSNowScraper) -> None:
+    counts = scraper.upsert_counts
+    if counts is not None:
+        print(f"[*] Upsert: {counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged")
+    counts = scraper.history_counts
+    if counts is not None:
+        print(f"[*] History: {counts['new']} new, {counts['changed']} changed, "
+              f"{counts['unchanged']} unchanged")
+
+
+def _outputs_exist(cfg: ScrapeConfig) -> bool:
+    paths = {
+        "csv": cfg.out_csv, "xlsx": cfg.out_xlsx, "sqlite": cfg.out_db,
+        "parquet": cfg.out_parquet, "jsonl": cfg.out_jsonl,
+    }
+    return all(os.path.exists(paths[f]) for f in cfg.formats if f in paths)
+
+
+def _report_unchanged(tracker: ChangeTracker) -> None:
+    print(f"[*] Orders unchanged since last run; skipped parse and save "
+          f"(skip rate {tracker.skips}/{tracker.checks} = {tracker.skip_rate:.0%}).")
+
+
+def _report_session_cache(cache: Optional[SessionCache]) -> None:
+    if cache is not None:
+        state = "reused cached session" if cache.hits else "logged in, session cached"
+        print(f"[*] Session cache: {state} (hits={cache.hits} misses={cache.misses})")
+
+
+def _report_details(counts: dict) -> None:
+    print(f"[*] Details: {counts['fetched']} fetched, {counts['skipped']} unchanged, "
+          f"{counts['failed']} failed; {counts['items']} items saved to order_items")
+
+
 def run_cli(cfg: ScrapeConfig) -> int:
+    if cfg.engine == "async":
+        return asyncio.run(run_async(cfg))
     scraper = YBSNowScraper(cfg)
+    # Skipping is only safe for single-page runs whose previous outputs are all in place.
+    conditional = scraper.change_tracker is not None and not cfg.all_pages and _outputs_exist(cfg)
+    # Change tracking hashes the whole page and JSON discovery reads it, so both need the buffered fetch.
+    stream = cfg.stream and not cfg.all_pages and scraper.change_tracker is None and not cfg.json_discovery
+    # Streaming on into the outputs keeps memory flat; upsert/history/--details need the whole table.
+    pipeline = stream and scraper.streams_outputs
     print("[*] Logging in...")
-    scraper.login()
-    print("[*] Fetching Orders page...")
-    html = scraper.fetch_orders_html()
-    print("[*] Parsing Orders table...")
-    df = scraper.parse_orders_table(html)
+    html = scraper.start_session(conditional=conditional, stream=stream, save=pipeline)
+    _report_session_cache(scraper.session_cache)
+    if pipeline:
+        result = scraper.streamed
+        if result is None:
+            print("[*] Fetching, parsing and saving Orders page (streaming)...")
+            result = scraper.stream_outputs()
+        scraper.metrics.add("rows_parsed", result.rows)
+        print(f"[*] Parsed {result.rows} rows and {len(result.columns)} columns.")
+        _report_saved(result.paths)
+        return 0
+    df = None
+    if cfg.json_discovery:
+        if html is None and not scraper.orders_unchanged:
+            print("[*] Fetching Orders page...")
+            html = scraper.fetch_orders_html(conditional=conditional)
+        if scraper.orders_unchanged:
+            _report_unchanged(scraper.change_tracker)
+            return 0
+        print("[*] Looking for JSON order data behind the Orders page...")
+        df = scraper.fetch_orders_json(html)
+        if df is None:
+            print("[*] No JSON order data found; using the HTML table.")
+    if df is not None:
+        print("[*] Loaded Orders from JSON.")
+    elif cfg.all_pages:
+        print(f"[*] Fetching all Orders pages ({cfg.page_workers} workers)...")
+        df = scraper.fetch_all_orders(first_html=html)
+    elif stream:
+        df = scraper.orders_frame
+        if df is None:
+            print("[*] Fetching and parsing Orders page (streaming)...")
+            df = scraper.fetch_orders_table()
+    else:
+        if html is None and not scraper.orders_unchanged:
+            print("[*] Fetching Orders page...")
+            html = scraper.fetch_orders_html(conditional=conditional)
+        if scraper.orders_unchanged:
+            _report_unchanged(scraper.change_tracker)
+            return 0
+        print("[*] Parsing Orders table...")
+        df = scraper.parse_orders_table(html)
+    scraper.metrics.add("rows_parsed", len(df))
     print(f"[*] Parsed {len(df)} rows and {len(df.columns)} columns.")
-    csv_path, xlsx_path, db_path = scraper.save_outputs(df)
-    print(f"[*] Saved: \n  CSV : {csv_path}\n  XLSX: {xlsx_path}\n  DB  : {db_path}")
+    paths = scraper.save_outputs(df)
+    _report_saved(paths)
+    _report_db(scraper)
+    if cfg.details:
+        print(f"[*] Crawling order detail pages ({cfg.detail_workers} workers)...")
+        _report_details(scraper.crawl_order_details(df))
+    if scraper.change_tracker is not None:
+        scraper.change_tracker.commit()
+    return 0
+
+
+def _frame_digest(df: pd.DataFrame) -> str:
+    """Content hash of a parsed table (columns + values, index ignored)."""
+    h = hashlib.sha256(repr(list(df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def run_watch(cfg: ScrapeConfig) -> int:
+    """Daemon mode: one warm process and session polling the Orders page every cfg.watch_interval.
+
+    Logs in once (or reuses cached cookies) and only logs in again when the session is
+    found expired anywhere in a poll (first page, later --all-pages pages), then retries
+    that poll. An unchanged page skips parsing; a changed page whose rows are the same
+    skips writing. With cfg.json_discovery each poll reads the JSON behind the page (the
+    page itself may never change), and with cfg.details detail pages are crawled after
+    every write. Transient fetch errors and SQLite errors (a locked database) are logged
+    and retried next poll. Stops on Ctrl+C / SIGTERM, or after cfg.watch_count polls.
+    """
+    import random
+    import signal
+    import sqlite3
+
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    scraper = YBSNowScraper(cfg)
+    print(f"[*] Watching Orders every {cfg.watch_interval:g}s (jitter ±{cfg.watch_jitter:.0%}); Ctrl+C to stop.")
+    tracker = scraper.change_tracker
+    # Persisted validators (--skip-unchanged) also let polls use conditional GETs.
+    conditional = tracker is not None and not cfg.all_pages and _outputs_exist(cfg)
+    print("[*] Logging in...")
+    html = scraper.start_session(conditional=conditional)
+    _report_session_cache(scraper.session_cache)
+    last_page = last_rows = None
+    polls = writes = 0
+
+    def poll(html: Optional[str], stamp: str) -> None:
+        nonlocal last_page, last_rows, writes
+        if html is None and not scraper.orders_unchanged:
+            html = scraper.fetch_orders_html(conditional=conditional)
+        if scraper.orders_unchanged:
+            print(f"[*] {stamp} No change (skip rate {tracker.skip_rate:.0%}).")
+            return
+        page = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        # With --all-pages or --discover-json, page 1 alone says nothing about the orders.
+        if page == last_page and not cfg.all_pages and not cfg.json_discovery:
+            print(f"[*] {stamp} No change.")
+            return
+        df = scraper.fetch_orders_json(html) if cfg.json_discovery else None
+        if df is None:
+            df = scraper.fetch_all_orders(first_html=html) if cfg.all_pages else scraper.parse_orders_table(html)
+        scraper.metrics.add("rows_parsed", len(df))
+        rows = _frame_digest(df)
+        if rows == last_rows:
+            print(f"[*] {stamp} Page changed, rows unchanged ({len(df)} rows).")
+        else:
+            scraper.save_outputs(df)
+            writes += 1
+            print(f"[*] {stamp} Saved {len(df)} rows.")
+            _report_db(scraper)
+            if cfg.details:
+                _report_details(scraper.crawl_order_details(df))
+        if tracker is not None:
+            tracker.commit()
+        last_page, last_rows = page, rows
+
+    try:
+        while not stop.is_set():
+            polls += 1
+            stamp = time.strftime("%H:%M:%S")
+            try:
+                try:
+                    poll(html, stamp)
+                except PermissionError:
+                    # A rejected login below is fatal; an expired session is not.
+                    print(f"[*] {stamp} Session expired; logging in again...")
+                    scraper.login()
+                    if scraper.session_cache is not None:
+                        scraper.session_cache.save(scraper.sess.cookies)
+                    scraper.orders_unchanged = False
+                    poll(None, stamp)
+            except (RuntimeError, ValueError, sqlite3.Error) as e:
+                print(f"[!] {stamp} Poll failed: {e}")
+            finally:
+                html = None
+                scraper.orders_unchanged = False
+                conditional = tracker is not None and not cfg.all_pages and _outputs_exist(cfg)
+                if cfg.metrics_file:  # one record (or textfile refresh) per poll
+                    scraper.metrics.write(cfg.metrics_file)
+                    scraper.metrics.reset()
+            if cfg.watch_count and polls >= cfg.watch_count:
+                break
+            stop.wait(max(0.0, cfg.watch_interval * (1 + random.uniform(-cfg.watch_jitter, cfg.watch_jitter))))
+    except KeyboardInterrupt:
+        pass
+    print(f"[*] Stopped after {polls} polls ({writes} writes).")
     return 0
 
 
@@ -292,16 +4075,14 @@ def launch_gui(default_cfg: ScrapeConfig) -> None:
         try:
             scraper = YBSNowScraper(cfg)
             scraper.login()
-            status_var.set("Fetching Orders page…")
-            html = scraper.fetch_orders_html()
-            status_var.set("Parsing table…")
-            df = scraper.parse_orders_table(html)
-            csv_path, xlsx_path, db_path = scraper.save_outputs(df)
+            status_var.set("Fetching, parsing and saving Orders…")
+            head = scraper.scrape_and_save().to_string(index=False)
+            result = scraper.streamed
             status_var.set("Done.")
-            head = df.head(20).to_string(index=False)
+            saved = "".join(f"Saved {fmt.upper()}: {path}\n" for fmt, path in result.paths.items())
             preview.insert(
                 "1.0",
-                f"Rows: {len(df)}  Cols: {len(df.columns)}\nSaved CSV: {csv_path}\nSaved XLSX: {xlsx_path}\nSaved DB: {db_path}\n\nPreview (first 20 rows):\n{head}\n",
+                f"Rows: {result.rows}  Cols: {len(result.columns)}\n{saved}\nPreview (first {PREVIEW_ROWS} rows):\n{head}\n",
             )
         except Exception as e:
             status_var.set("Error.")
@@ -322,6 +4103,8 @@ def launch_gui(default_cfg: ScrapeConfig) -> None:
 # --------------------------- Utilities ------------------------------
 
 def load_config_from_env() -> dict:
+    from dotenv import load_dotenv
+
     load_dotenv()
     return {
         "email": os.getenv("YBSNOW_EMAIL", ""),
@@ -340,10 +4123,28 @@ def build_cfg(args: argparse.Namespace) -> ScrapeConfig:
     email = args.email or env["email"]
     password = args.password or env["password"]
 
-    if not orders_url:
+    if args.batch:
+        if args.watch:
+            raise SystemExit("--batch and --watch cannot be combined")
+        # Detail pages need each target's own session; validators are per Orders URL.
+        for flag, on in (("--details", args.details), ("--skip-unchanged", args.skip_unchanged)):
+            if on:
+                raise SystemExit(f"{flag} is not supported with --batch")
+    elif not orders_url:
         raise SystemExit("Orders URL is required (use --orders-url or YBSNOW_ORDERS_URL in .env)")
-    if not email or not password:
+    elif not email or not password:
         raise SystemExit("Email and Password are required (use --email/--password or .env)")
+    if args.engine == "async" and not (args.watch or args.batch):  # those always run on the sync engine
+        for flag, on in (("--details", args.details), ("--discover-json", args.discover_json),
+                         ("--skip-unchanged", args.skip_unchanged)):
+            if on:
+                raise SystemExit(f"{flag} needs the sync engine (drop --engine async)")
+    formats = tuple(f.strip().lower() for f in args.formats.split(",") if f.strip())
+    unknown = sorted(set(formats) - set(OUTPUT_FORMATS))
+    if unknown or not formats:
+        raise SystemExit(f"--formats must list one or more of: {', '.join(OUTPUT_FORMATS)} (got {args.formats!r})")
+    if args.details and "sqlite" not in formats:
+        raise SystemExit("--details stores line items in the SQLite DB; add sqlite to --formats")
 
     return ScrapeConfig(
         base_url=base_url,
@@ -354,7 +4155,50 @@ def build_cfg(args: argparse.Namespace) -> ScrapeConfig:
         out_csv=args.out_csv,
         out_xlsx=args.out_xlsx,
         out_db=args.db_file,
-        timeout=args.timeout,
+        out_parquet=args.out_parquet,
+        out_jsonl=args.out_jsonl,
+        formats=formats,
+        parquet_compression=args.parquet_compression,
+        typed_columns=not args.raw_text,
+        string_storage=args.string_storage,
+        connect_timeout=args.connect_timeout if args.timeout is None else args.timeout,
+        read_timeout=args.read_timeout if args.timeout is None else args.timeout,
+        http_retries=args.retries,
+        backoff_base=args.backoff,
+        backoff_max=args.backoff_max,
+        backoff_jitter=max(0.0, args.backoff_jitter),
+        pool_connections=args.pool_connections,
+        pool_maxsize=args.pool_maxsize,
+        stream=not args.no_stream,
+        stream_batch_rows=max(1, args.stream_batch),
+        all_pages=args.all_pages,
+        page_workers=args.page_workers,
+        page_retries=args.page_retries,
+        max_pages=args.max_pages,
+        engine=args.engine,
+        async_concurrency=args.concurrency,
+        parse_processes=args.parse_processes,
+        session_cache_dir="" if args.no_session_cache else args.session_cache,
+        db_mode=args.db_mode,
+        db_key=args.db_key or "",
+        history=args.history,
+        watch_interval=args.watch or 0.0,
+        watch_jitter=args.jitter,
+        watch_count=args.watch_count,
+        change_state_file=args.change_state if args.skip_unchanged else "",
+        selector_cache_file="" if args.no_selector_cache else args.selector_cache,
+        metrics_file=args.metrics,
+        json_discovery=args.discover_json,
+        details=args.details,
+        detail_workers=args.detail_workers,
+        detail_rate=args.detail_rate,
+        renderer=args.render or "",
+        render_pool=args.render_pool,
+        render_timeout=args.render_timeout,
+        batch_manifest=args.batch or "",
+        batch_workers=args.batch_workers,
+        batch_per_host=args.per_host,
+        batch_processes=args.batch_processes,
     )
 
 
@@ -368,7 +4212,83 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     p.add_argument("--out-csv", default="orders.csv", help="Path to save CSV (default: orders.csv)")
     p.add_argument("--out-xlsx", default="orders.xlsx", help="Path to save Excel (default: orders.xlsx)")
     p.add_argument("--db-file", default="orders.db", help="Path to SQLite DB file (default: orders.db)")
-    p.add_argument("--timeout", type=int, default=30, help="HTTP timeout seconds (default: 30)")
+    p.add_argument("--out-parquet", default="orders.parquet", help="Path to save Parquet (default: orders.parquet)")
+    p.add_argument("--out-jsonl", default="orders.jsonl", help="Path to save JSON Lines (default: orders.jsonl)")
+    p.add_argument("--parquet-compression", choices=["zstd", "snappy", "gzip", "none"], default="zstd",
+                   help="Parquet column compression (default: zstd)")
+    p.add_argument("--raw-text", action="store_true",
+                   help="Keep cells as stripped text; skip date/number/money/category typing")
+    p.add_argument("--string-storage", choices=["auto", "pyarrow", "python"], default="auto",
+                   help="Backing store for text columns (default: auto = pyarrow when installed)")
+    p.add_argument("--formats", default="csv,xlsx,sqlite",
+                   help=f"Comma-separated outputs to write: {','.join(OUTPUT_FORMATS)} (default: csv,xlsx,sqlite)")
+    p.add_argument("--db-mode", choices=["replace", "upsert"], default="replace",
+                   help="replace: rewrite the orders table each run; upsert: merge new/changed rows by key (default: replace)")
+    p.add_argument("--db-key", default=None, help="Key column for --db-mode upsert / --history (default: auto-detect, e.g. 'Order #')")
+    p.add_argument("--history", action="store_true",
+                   help="Record new/changed rows with timestamps in the orders_history table")
+    p.add_argument("--connect-timeout", type=float, default=10.0, help="Seconds to establish a connection (default: 10)")
+    p.add_argument("--read-timeout", type=float, default=30.0, help="Seconds to wait for response data (default: 30)")
+    p.add_argument("--timeout", type=float, default=None, help="Set both --connect-timeout and --read-timeout")
+    p.add_argument("--retries", type=int, default=3,
+                   help="Retries per GET on connection errors, timeouts, 429 and 5xx (default: 3)")
+    p.add_argument("--backoff", type=float, default=0.5,
+                   help="First retry delay in seconds, doubled per retry, plus jitter; Retry-After wins (default: 0.5)")
+    p.add_argument("--backoff-max", type=float, default=30.0, help="Cap on one backoff delay in seconds (default: 30)")
+    p.add_argument("--backoff-jitter", type=float, default=0.5,
+                   help="Up to this many random seconds added to each backoff delay; 0 disables (default: 0.5)")
+    p.add_argument("--no-stream", action="store_true",
+                   help="Download the whole Orders page before parsing instead of parsing it as it streams in")
+    p.add_argument("--stream-batch", type=int, default=10000, metavar="ROWS",
+                   help="Rows parsed, cleaned and written per batch when streaming to the outputs (default: 10000)")
+    p.add_argument("--pool-connections", type=int, default=10, help="Per-host connection pools to keep (default: 10)")
+    p.add_argument("--pool-maxsize", type=int, default=0,
+                   help="Keep-alive connections per host (default: 0 = max(10, --page-workers))")
+    p.add_argument("--all-pages", action="store_true", help="Follow pagination links and scrape every Orders page")
+    p.add_argument("--page-workers", type=int, default=4, help="Concurrent page fetches with --all-pages (default: 4)")
+    p.add_argument("--page-retries", type=int, default=2, help="Retries per page on transient errors (default: 2)")
+    p.add_argument("--max-pages", type=int, default=500, help="Maximum pages fetched with --all-pages (default: 500)")
+    p.add_argument("--engine", choices=["sync", "async"], default="sync",
+                   help="HTTP engine: sync (requests) or async (httpx, pip install httpx) (default: sync)")
+    p.add_argument("--concurrency", type=int, default=8, help="Async engine: max in-flight requests (default: 8)")
+    p.add_argument("--parse-processes", type=int, default=0,
+                   help="Async engine: parse pages in N worker processes instead of threads (default: 0)")
+    p.add_argument("--session-cache", default=DEFAULT_SESSION_CACHE_DIR,
+                   help=f"Directory for cached login cookies (default: {DEFAULT_SESSION_CACHE_DIR})")
+    p.add_argument("--no-session-cache", action="store_true", help="Always log in; never read or write cached cookies")
+    p.add_argument("--skip-unchanged", action="store_true",
+                   help="Use conditional GETs / table hashing and skip parse+save when the Orders page is unchanged")
+    p.add_argument("--change-state", default=DEFAULT_CHANGE_STATE_FILE,
+                   help=f"File storing ETag/Last-Modified/table hashes for --skip-unchanged (default: {DEFAULT_CHANGE_STATE_FILE})")
+    p.add_argument("--selector-cache", default=DEFAULT_SELECTOR_CACHE_FILE,
+                   help=f"File remembering where the orders table was found when no known selector matched (default: {DEFAULT_SELECTOR_CACHE_FILE})")
+    p.add_argument("--no-selector-cache", action="store_true", help="Always scan every table when no known selector matches")
+    p.add_argument("--discover-json", action="store_true",
+                   help="Load orders from inline JSON / the XHR endpoints behind the Orders page when found, else parse the table")
+    p.add_argument("--details", action="store_true",
+                   help="Crawl each order's detail page into an order_items table in --db-file (changed orders only)")
+    p.add_argument("--detail-workers", type=int, default=4, help="--details: concurrent detail fetches (default: 4)")
+    p.add_argument("--detail-rate", type=float, default=2.0,
+                   help="--details: max detail requests per second per host, 0 = unlimited (default: 2)")
+    p.add_argument("--render", choices=sorted(RENDERERS), default=None,
+                   help="Render pages whose static HTML has no orders table in a headless browser (pip install selenium)")
+    p.add_argument("--render-pool", type=int, default=1, help="--render: warm browsers to keep (default: 1)")
+    p.add_argument("--render-timeout", type=float, default=20.0,
+                   help="--render: seconds to wait for the rendered table (default: 20)")
+    p.add_argument("--metrics", default="", metavar="PATH",
+                   help="Write per-stage wall/CPU time, bytes, rows and peak RSS: JSON lines, or a Prometheus textfile if PATH ends in .prom")
+    p.add_argument("--profile", nargs="?", const="ybsnow.prof", default=None, metavar="FILE",
+                   help="Run under cProfile, dump stats to FILE (default: ybsnow.prof) and print the top functions")
+    p.add_argument("--watch", type=float, default=None, metavar="SECONDS",
+                   help="Keep running and poll the Orders page every SECONDS, writing outputs only on change")
+    p.add_argument("--jitter", type=float, default=0.1, help="--watch: randomise each interval by +/- this fraction (default: 0.1)")
+    p.add_argument("--watch-count", type=int, default=0, help="--watch: stop after N polls (default: run until stopped)")
+    p.add_argument("--batch", default=None, metavar="MANIFEST",
+                   help="Scrape every account/Orders URL in a YAML/JSON/TOML manifest into one set of outputs")
+    p.add_argument("--batch-workers", type=int, default=4, help="--batch: targets scraped concurrently (default: 4)")
+    p.add_argument("--per-host", type=int, default=2, help="--batch: max concurrent targets per host (default: 2)")
+    p.add_argument("--batch-processes", action="store_true",
+                   help="--batch: run targets in worker processes instead of threads")
     p.add_argument("--gui", action="store_true", help="Launch the customtkinter GUI")
     return p.parse_args(argv)
 
@@ -397,7 +4317,30 @@ def main(argv: Optional[List[str]] = None) -> int:
 
     # Otherwise run CLI mode
     cfg = build_cfg(args)
-    return run_cli(cfg)
+    if args.profile:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(_dispatch, cfg)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"[*] Profile written to {args.profile}; top functions by cumulative time:")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    return _dispatch(cfg)
+
+
+def _dispatch(cfg: ScrapeConfig) -> int:
+    if cfg.watch_interval > 0 and not cfg.batch_manifest:
+        return run_watch(cfg)  # writes metrics after every poll
+    try:
+        if cfg.batch_manifest:
+            return run_batch(cfg)
+        return run_cli(cfg)
+    finally:
+        if cfg.metrics_file:
+            RUN_METRICS.write(cfg.metrics_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the YBSNow Order Scraper.
+
+Usage
+  python bench_ybsnow.py parse [--rows 1000 10000 100000] [--repeat 3]
+  python bench_ybsnow.py parity
+  python bench_ybsnow.py cdc
+  python bench_ybsnow.py pool
+  python bench_ybsnow.py outputs [--rows 100000] [--repeat 3]
+  python bench_ybsnow.py clean [--rows 100000] [--width 40] [--repeat 3]
+  python bench_ybsnow.py startup [--repeat 5] [--max-ms 150]
+  python bench_ybsnow.py login [--rows 1000 10000] [--repeat 5]
+  python bench_ybsnow.py score [--tables 100 500] [--rows 1000] [--repeat 3] [--max-ms 500]
+  python bench_ybsnow.py suite [--rows 1000 10000 100000] [--scenarios selector fallback wide]
+                               [--stages] [--compare last] [--results bench_results.jsonl]
+
+Everything runs offline against synthetic orders pages generated here, so no
+credentials or network access are needed. suite runs the real scraper CLI end to
+end against a local HTTP stand-in for the login and Orders endpoints.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import Ybsnow_Order_Scraper as ybs
+
+STATUSES = ["Open", "In Progress", "On Hold", "Shipped", "Closed"]
+WORKSTATIONS = ["Print", "Laminate", "Cut", "Pack", "QA", "Dispatch"]
+OPERATORS = ["A. Nguyen", "B. Okafor", "C. Silva", "D. Kowalski", "E. Haddad", "F. Larsen"]
+STATUS_NOTES = [
+    "awaiting customer proof approval", "substrate back-ordered", "ready for collection",
+    "rework requested by QA", "partial shipment sent", "invoice queried",
+]
+
+
+def make_orders_page(rows: int, layout_tables: int = 20, seed: int = 0) -> str:
+    """Synthetic orders page: navigation/layout tables around one table#orders."""
+    return "".join(iter_orders_page(rows, layout_tables, seed))
+
+
+def iter_orders_page(
+    rows: int, layout_tables: int = 20, seed: int = 0, wide: bool = False, selector: bool = True,
+) -> Iterator[str]:
+    """make_orders_page in pieces, so pages with a million rows can go straight to disk.
+
+    wide: long, high-cardinality Status/Workstation text (notes, lines, operators).
+    selector=False: the orders table matches no known selector, forcing the scored fallback.
+    """
+    rnd = random.Random(seed)
+    yield "<html><head><title>Orders</title></head><body>"
+    for i in range(layout_tables):
+        yield (
+            f'<table class="layout"><tr><td><a href="/nav/{i}">Menu {i}</a></td>'
+            f"<td><table><tr><td>nested {i}</td></tr></table></td></tr></table>"
+        )
+    yield (
+        ('<table id="orders" class="table table-striped">' if selector else '<table class="grid">')
+        + "<thead><tr><th>Order #</th><th>PO</th><th>Customer</th><th>Workstation</th>"
+        "<th>Status</th><th>Date</th><th>Due</th><th>Qty</th><th>Total</th>"
+        "</tr></thead><tbody>"
+    )
+    batch = []
+    for n in range(rows):
+        head = f"<tr><td>{100000 + n}</td><td>PO-{rnd.randint(1000, 9999)}</td><td> Customer {rnd.randint(1, 500)} </td>"
+        workstation, status = rnd.choice(WORKSTATIONS), rnd.choice(STATUSES)
+        if wide:
+            workstation = f"{workstation} / Line {rnd.randint(1, 40)} / {rnd.choice(OPERATORS)}"
+            status = f"{status} - {rnd.choice(STATUS_NOTES)} ({rnd.randint(1, 99)})"
+        batch.append(
+            f"{head}<td>{workstation}</td><td>{status}</td>"
+            f"<td>2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}</td>"
+            f"<td>2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}</td>"
+            f"<td>{rnd.randint(1, 5000):,}</td><td>${rnd.uniform(5, 9000):,.2f}</td></tr>"
+        )
+        if len(batch) == 1000:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch)
+    yield "</tbody></table></body></html>"
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+# ------------------------------ parse -------------------------------
+
+def bench_parse(args: argparse.Namespace) -> None:
+    scraper = ybs.YBSNowScraper(ybs.ScrapeConfig("", "", "", "", ""))
+    print(f"{'rows':>8} {'MB':>7} {'lxml-target s':>14} {'read_html s':>17} {'speedup':>8}")
+    for rows in args.rows:
+        html = make_orders_page(rows)
+        fast_s, fast_df = best_of(lambda: ybs.OrdersTableExtractor().extract(html), args.repeat)
+        slow_s, slow_df = best_of(lambda: scraper._parse_selected_table(html), args.repeat)
+        if fast_df is None or slow_df is None or not fast_df.equals(slow_df):
+            raise SystemExit(f"Extractors disagree at {rows} rows")
+        print(f"{rows:>8} {len(html) / 1e6:>7.1f} {fast_s:>14.3f} {slow_s:>17.3f} {slow_s / fast_s:>7.1f}x")
+
+
+# ------------------------------ parity ------------------------------
+
+def _table(body: str, head: str = "<tr><th>Order #</th><th>Customer</th><th>Qty</th><th>Paid</th></tr>") -> str:
+    return f'<html><body><table id="orders"><thead>{head}</thead>{body}</table></body></html>'
+
+
+# Pages where a hand-rolled extractor is most likely to drift from read_html.
+PARITY_PAGES = {
+    "br in cells": _table(
+        "<tbody><tr><td>100001</td><td>12 High St<br>Leeds</td><td>1</td><td>True</td></tr>"
+        "<tr><td>100002</td><td>Unit 4 <br/> Hull</td><td>2</td><td>False</td></tr></tbody>"
+    ),
+    "na values": _table(
+        "<tbody><tr><td>100001</td><td>N/A</td><td>N/A</td><td>NA</td></tr>"
+        "<tr><td>100002</td><td>-</td><td>1,250</td><td>null</td></tr>"
+        "<tr><td>100003</td><td>None</td><td></td><td>n/a</td></tr></tbody>"
+    ),
+    "booleans with gaps": _table(
+        "<tbody><tr><td>100001</td><td>Acme</td><td>1</td><td>true</td></tr>"
+        "<tr><td>100002</td><td>Beta</td><td>2</td><td></td></tr></tbody>"
+    ),
+    "tfoot first": _table(
+        "<tfoot><tr><td>Total</td><td></td><td>3</td><td></td></tr></tfoot>"
+        "<tbody><tr><td>100001</td><td>Acme</td><td>1</td><td>True</td></tr>"
+        "<tr><td>100002</td><td>Beta</td><td>2</td><td>False</td></tr></tbody>"
+    ),
+    "no thead": _table(
+        "<tr><td>100001</td><td>Acme &amp; Co</td><td>3</td><td>True</td></tr>", head="",
+    ).replace("<thead></thead>", "<tr><th>Order #</th><th>Customer</th><th>Qty</th><th>Paid</th></tr>"),
+    "colspan and blank header": _table(
+        "<tbody><tr><td colspan=\"2\">100001</td><td>1</td><td>x</td></tr></tbody>",
+        head="<tr><th>Order #</th><th></th><th>Qty</th><th>Qty</th></tr>",
+    ),
+    "synthetic page": make_orders_page(500),
+}
+
+
+def bench_parity(args: argparse.Namespace) -> None:
+    scraper = ybs.YBSNowScraper(ybs.ScrapeConfig("", "", "", "", ""))
+    failed = []
+    for name, html in PARITY_PAGES.items():
+        fast = ybs.OrdersTableExtractor().extract(html)
+        slow = scraper._parse_selected_table(html)
+        same = fast is not None and slow is not None and fast.equals(slow) and (fast.dtypes == slow.dtypes).all()
+        print(f"{'ok' if same else 'DIFFERS':>8}  {name}")
+        if not same:
+            failed.append(name)
+            print(f"lxml target:\n{fast}\nread_html:\n{slow}")
+    if failed:
+        raise SystemExit(f"Extractor differs from read_html on: {', '.join(failed)}")
+
+
+# ------------------------------- cdc --------------------------------
+
+# Three scrapes in which only order 1003 changes; each change flips how its column would be
+# typed (a "TBD" date, every date day/month-ambiguous, a "5 (backorder)" quantity).
+CDC_RUNS = [
+    [("1001", "01/05/2025", "1"), ("1002", "02/03/2025", "2"), ("1003", "03/14/2025", "3")],
+    [("1001", "01/05/2025", "1"), ("1002", "02/03/2025", "2"), ("1003", "TBD", "3")],
+    [("1001", "01/05/2025", "1"), ("1002", "02/03/2025", "2"), ("1003", "03/04/2025", "5 (backorder)")],
+]
+
+
+def bench_cdc(args: argparse.Namespace) -> None:
+    """Upsert + history over CDC_RUNS: untouched orders must stay unchanged in every run."""
+    import sqlite3
+
+    head = "<tr><th>Order #</th><th>Order Date</th><th>Qty</th></tr>"
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = ybs.ScrapeConfig(
+            "", "", "", "", "", out_db=os.path.join(tmp, "orders.db"), formats=("csv", "sqlite"),
+            out_csv=os.path.join(tmp, "orders.csv"), db_mode="upsert", history=True,
+        )
+        stored = []
+        failed = []
+        for n, rows in enumerate(CDC_RUNS, 1):
+            body = "".join(f"<tr><td>{a}</td><td>{b}</td><td>{c}</td></tr>" for a, b, c in rows)
+            scraper = ybs.YBSNowScraper(cfg)
+            scraper.save_outputs(scraper.parse_orders_table(_table(f"<tbody>{body}</tbody>", head)))
+            upsert, history = scraper.upsert_counts, scraper.history_counts
+            print(f"run {n}: upsert {upsert}  history {history}")
+            if n > 1 and (upsert["updated"], upsert["unchanged"], history["changed"]) != (1, 2, 1):
+                failed.append(f"run {n}")
+            conn = sqlite3.connect(cfg.out_db)
+            try:
+                stored.append(conn.execute(
+                    'SELECT * FROM orders WHERE "Order #" IN (1001, 1002, \'1001\', \'1002\') ORDER BY 1'
+                ).fetchall())
+            finally:
+                conn.close()
+        if any(rows != stored[0] for rows in stored):
+            failed.append(f"stored rows of 1001/1002 drifted: {stored}")
+    if failed:
+        raise SystemExit(f"Unchanged orders were reported or stored as changed: {'; '.join(failed)}")
+
+
+# ------------------------------- pool -------------------------------
+
+class FakeBrowser:
+    """Stands in for a Selenium driver in BrowserPool checks."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.quits = 0
+
+    def quit(self) -> None:
+        self.quits += 1
+
+
+def bench_pool(args: argparse.Namespace) -> None:
+    """BrowserPool: discarded browsers free their slot and wake a waiter; nothing leaks past close()."""
+    import threading
+
+    failed = []
+
+    def check(name: str, ok: bool) -> None:
+        print(f"{'ok' if ok else 'FAILED':>8}  {name}")
+        if not ok:
+            failed.append(name)
+
+    launched: List[FakeBrowser] = []
+
+    def launch() -> FakeBrowser:
+        launched.append(FakeBrowser(len(launched) + 1))
+        return launched[-1]
+
+    def acquire_in_thread(pool: ybs.BrowserPool) -> Tuple[threading.Thread, list]:
+        got: list = []
+
+        def run() -> None:
+            try:
+                got.append(pool.acquire())
+            except RuntimeError as e:
+                got.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        time.sleep(0.05)  # let it block on the full pool
+        return thread, got
+
+    pool = ybs.BrowserPool(launch, size=1)
+    first = pool.acquire()
+    thread, got = acquire_in_thread(pool)
+    check("waiter blocks while the only browser is out", not got)
+    pool.release(first)
+    thread.join(2)
+    check("released browser wakes the waiter and is reused", got == [first] and len(launched) == 1)
+
+    thread, got = acquire_in_thread(pool)
+    pool.release(first, broken=True)
+    thread.join(2)
+    check("discarded browser is quit", first.quits == 1)
+    check("discard wakes the waiter, which launches a replacement",
+          len(got) == 1 and got[0] is launched[-1] and len(launched) == 2)
+
+    failures = [RuntimeError("chrome did not start")]
+
+    def flaky() -> FakeBrowser:
+        if failures:
+            raise failures.pop()
+        return launch()
+
+    flaky_pool = ybs.BrowserPool(flaky, size=1)
+    try:
+        flaky_pool.acquire()
+    except RuntimeError:
+        pass
+    thread, got = acquire_in_thread(flaky_pool)
+    thread.join(2)
+    check("failed launch frees its slot", len(got) == 1 and isinstance(got[0], FakeBrowser))
+    flaky_pool.close()
+
+    out = launched[-1]  # the replacement, still checked out
+    thread, got = acquire_in_thread(pool)
+    pool.close()
+    thread.join(2)
+    check("close wakes waiters with an error", len(got) == 1 and isinstance(got[0], RuntimeError))
+    quits = out.quits
+    pool.release(out)
+    check("browser released after close is quit, not pooled", out.quits == quits + 1 and not pool._idle)
+    pool.release(launch(), broken=True)
+    check("broken release after close is harmless", launched[-1].quits == 1)
+    try:
+        pool.acquire()
+        check("acquire after close raises", False)
+    except RuntimeError:
+        check("acquire after close raises", True)
+    if failed:
+        raise SystemExit(f"BrowserPool checks failed: {', '.join(failed)}")
+
+
+# ----------------------------- outputs ------------------------------
+
+def bench_outputs(args: argparse.Namespace) -> None:
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = ybs.ScrapeConfig(
+            "", "", "", "", "",
+            out_csv=os.path.join(tmp, "orders.csv"),
+            out_parquet=os.path.join(tmp, "orders.parquet"),
+        )
+        scraper = ybs.YBSNowScraper(cfg)
+        df = scraper.parse_orders_table(make_orders_page(args.rows))
+        print(f"{args.rows} rows x {len(df.columns)} columns")
+        print(f"{'format':>8} {'write s':>8} {'size MB':>8} {'reload s':>9} {'reload dtypes'}")
+        cases = [
+            ("csv", scraper._write_csv, pd.read_csv),
+            ("parquet", scraper._write_parquet, pd.read_parquet),
+        ]
+        for name, write, read in cases:
+            write_s, path = best_of(lambda: write(df), args.repeat)
+            read_s, back = best_of(lambda: read(path), args.repeat)
+            kinds = ",".join(sorted({str(t) for t in back.dtypes}))
+            print(f"{name:>8} {write_s:>8.3f} {os.path.getsize(path) / 1e6:>8.2f} {read_s:>9.3f} {kinds}")
+
+
+# ------------------------------ clean -------------------------------
+
+def make_wide_frame(rows: int, width: int, seed: int = 0):
+    """Raw read_html-style frame: every cell is text, columns cycle through order field kinds."""
+    import pandas as pd
+
+    rnd = random.Random(seed)
+    kinds = [
+        ("Status", lambda: rnd.choice(STATUSES)),
+        ("Workstation", lambda: rnd.choice(WORKSTATIONS)),
+        ("Date", lambda: f"{rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/2025"),
+        ("Total", lambda: f"${rnd.uniform(5, 9000):,.2f}"),
+        ("Qty", lambda: f"{rnd.randint(1, 5000):,}"),
+        ("Customer", lambda: f" Customer {rnd.randint(1, 50000)} " if rnd.random() > 0.05 else ""),
+    ]
+    data = {}
+    for i in range(width):
+        name, gen = kinds[i % len(kinds)]
+        data[f"{name} {i}"] = pd.Series([gen() for _ in range(rows)], dtype=object)
+    return pd.DataFrame(data)
+
+
+def legacy_clean_df(df):
+    """The pre-vectorization _clean_df, as it behaved on pandas 2.x (object columns)."""
+    df = df.copy()
+    df.columns = [str(c).strip().replace("\n", " ") for c in df.columns]
+    df = df.dropna(axis=1, how="all")
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str).str.strip().astype(object)
+    return df
+
+
+def bench_clean(args: argparse.Namespace) -> None:
+    raw = make_wide_frame(args.rows, args.width)
+    print(f"{args.rows} rows x {args.width} columns")
+    print(f"{'variant':>22} {'seconds':>8} {'memory MB':>10}")
+    variants = [("legacy (object)", legacy_clean_df)]
+    for storage in ("python", "pyarrow"):
+        cfg = ybs.ScrapeConfig("", "", "", "", "", string_storage=storage)
+        variants.append((f"typed ({storage} str)", lambda df, s=ybs.YBSNowScraper(cfg): s._clean_df(df.copy())))
+    baseline = None
+    for name, fn in variants:
+        try:
+            secs, out = best_of(lambda: fn(raw), args.repeat)
+        except ImportError:
+            print(f"{name:>22}  skipped (pyarrow not installed)")
+            continue
+        mem = out.memory_usage(deep=True).sum() / 1e6
+        note = f"({baseline / mem:.1f}x smaller)" if baseline else "(baseline)"
+        baseline = baseline or mem
+        print(f"{name:>22} {secs:>8.3f} {mem:>10.1f}  {note}")
+
+
+# ----------------------------- startup ------------------------------
+
+# Must not be imported by `import Ybsnow_Order_Scraper` / `--help`.
+HEAVY_MODULES = ("pandas", "numpy", "requests", "bs4", "lxml", "pyarrow", "openpyxl", "sqlite3", "asyncio")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ybsnow_Order_Scraper.py")
+
+
+def _importtime(code: str) -> List[Tuple[str, int, int]]:
+    """Run code under `python -X importtime`; returns (module, self_us, cumulative_us) rows."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(SCRIPT),
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    cold = []
+    rows: List[Tuple[str, int, int]] = []
+    for _ in range(args.repeat):
+        rows = _importtime("import Ybsnow_Order_Scraper")
+        cold.append(next(cum for name, _, cum in rows if name == "Ybsnow_Order_Scraper") / 1000)
+    help_s, _ = best_of(
+        lambda: subprocess.run([sys.executable, SCRIPT, "--help"], capture_output=True, check=True),
+        args.repeat,
+    )
+    print(f"import Ybsnow_Order_Scraper: best {min(cold):.1f} ms, median {sorted(cold)[len(cold) // 2]:.1f} ms")
+    print(f"Ybsnow_Order_Scraper.py --help: {help_s * 1000:.0f} ms wall (incl. interpreter start)")
+    print("slowest imports (cumulative):")
+    for name, _, cum in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"  {cum / 1000:>8.1f} ms  {name}")
+
+    leaked = sorted({name.split(".")[0] for name, _, _ in rows} & set(HEAVY_MODULES))
+    failures = []
+    if leaked:
+        failures.append(f"heavy modules imported at startup: {', '.join(leaked)}")
+    if args.max_ms and min(cold) > args.max_ms:
+        failures.append(f"import took {min(cold):.1f} ms > --max-ms {args.max_ms}")
+    if failures:
+        raise SystemExit("REGRESSION: " + "; ".join(failures))
+
+
+# ------------------------------ login -------------------------------
+
+LOGIN_PAGE = (
+    "<html><body><div class='nav'><a href='/'>Home</a></div>"
+    '<form name="signin" id="signin" method="post" action="index.php">'
+    '<input type="email" name="email"><input type="password" name="password">'
+    '<input type="hidden" name="action" value="signin"></form></body></html>'
+)
+
+
+def bench_login(args: argparse.Namespace) -> None:
+    """Byte-level sign-in form scan vs the BeautifulSoup parse it replaced, on typical pages."""
+    pages = [("login page", LOGIN_PAGE)]
+    for rows in args.rows:
+        html = make_orders_page(rows)
+        pages.append((f"orders {rows}", html))
+        # Worst case for the scan: "signin" appears, so <form> tags must be inspected.
+        pages.append((f"orders {rows} +link", html.replace("<body>", '<body><a href="/signin">Sign out</a><form id="search"></form>', 1)))
+    print(f"{'page':>22} {'KB':>8} {'soup ms':>9} {'scan ms':>9} {'speedup':>8}")
+    for name, html in pages:
+        body = html.encode("utf-8")
+        soup_s, want = best_of(lambda: ybs._soup_has_signin_form(body), args.repeat)
+        scan_s, got = best_of(lambda: ybs.looks_like_login_page(body), args.repeat)
+        if want != got:
+            raise SystemExit(f"Detectors disagree on {name}: soup={want} scan={got}")
+        print(f"{name:>22} {len(body) / 1e3:>8.0f} {soup_s * 1e3:>9.2f} {scan_s * 1e3:>9.3f} {soup_s / scan_s:>7.0f}x")
+
+
+# ------------------------------ score -------------------------------
+
+def legacy_pick_best_table(html: str):
+    """The pre-scoring-engine fallback: read_html every table, nested name-substring loop."""
+    import pandas as pd
+    from io import StringIO
+
+    tables = pd.read_html(StringIO(html))
+    best_idx, best_score = None, -1
+    for i, df in enumerate(tables):
+        score = sum(1 for c in df.columns if any(pc.lower() in str(c).lower() for pc in ybs.PREFERRED_COLUMNS))
+        if score > best_score and len(df.columns) > 1 and len(df) > 0:
+            best_score, best_idx = score, i
+    return tables[0] if best_idx is None else tables[best_idx]
+
+
+def bench_score(args: argparse.Namespace) -> None:
+    """Fallback table pick (no known selector) on pages with many layout tables."""
+    scraper = ybs.YBSNowScraper(ybs.ScrapeConfig("", "", "", "", ""))
+    print(f"{'tables':>7} {'rows':>7} {'read_html s':>12} {'scored s':>9} {'speedup':>8}")
+    failures = []
+    for tables in args.tables:
+        html = make_orders_page(args.rows, layout_tables=tables).replace(
+            'id="orders" class="table table-striped"', 'class="grid"', 1
+        )
+        slow_s, want = best_of(lambda: legacy_pick_best_table(html), args.repeat)
+        fast_s, got = best_of(lambda: scraper._pick_best_table(ybs.OrdersPage(html)), args.repeat)
+        if not got.equals(want):
+            raise SystemExit(f"Pickers disagree with {tables} layout tables")
+        print(f"{tables:>7} {args.rows:>7} {slow_s:>12.3f} {fast_s:>9.3f} {slow_s / fast_s:>7.1f}x")
+        if args.max_ms and fast_s * 1e3 > args.max_ms:
+            failures.append(f"{tables} tables took {fast_s * 1e3:.0f} ms > --max-ms {args.max_ms}")
+    if failures:
+        raise SystemExit("REGRESSION: " + "; ".join(failures))
+
+
+# ------------------------------ suite -------------------------------
+
+STANDIN_LOGIN_PAGE = LOGIN_PAGE
+SCENARIOS = {
+    # name: iter_orders_page options
+    "selector": {},
+    "fallback": {"selector": False},
+    "wide": {"wide": True},
+}
+
+
+class StandInSite:
+    """Local HTTP stand-in for the YBSNow landing page, login POST (index.php) and Orders page.
+
+    Landing sets a PHPSESSID cookie; a POST to index.php marks it signed in and redirects to
+    a small dashboard. /orders.php serves the pre-generated page gzip-compressed (as the real
+    site does) to signed-in sessions and bounces everyone else to the sign-in form.
+    """
+
+    def __init__(self, orders_gz: str):
+        import http.server
+        import threading
+
+        self.orders_gz = orders_gz
+        self.sessions: set = set()
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _session(self) -> str:
+                for part in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = part.strip().partition("=")
+                    if name == "PHPSESSID":
+                        return value
+                return ""
+
+            def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                signed_in = self._session() in site.sessions
+                if path == "/orders.php" and signed_in:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Encoding", "gzip")
+                    self.send_header("Content-Length", str(os.path.getsize(site.orders_gz)))
+                    self.end_headers()
+                    with open(site.orders_gz, "rb") as f:
+                        while chunk := f.read(1 << 16):
+                            self.wfile.write(chunk)
+                elif path == "/orders.php":
+                    self._send(302, headers={"Location": "/index.php"})
+                elif path == "/dashboard.php" and signed_in:
+                    self._send(200, b"<html><body><h1>Dashboard</h1></body></html>", {"Content-Type": "text/html"})
+                else:
+                    headers = {"Content-Type": "text/html"}
+                    if not self._session():
+                        headers["Set-Cookie"] = f"PHPSESSID={os.urandom(8).hex()}; Path=/"
+                    self._send(200, STANDIN_LOGIN_PAGE.encode(), headers)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self._session():
+                    site.sessions.add(self._session())
+                    self._send(302, headers={"Location": "/dashboard.php"})
+                else:
+                    self._send(200, STANDIN_LOGIN_PAGE.encode(), {"Content-Type": "text/html"})
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def write_orders_page(path: str, rows: int, layout_tables: int, **options) -> int:
+    """Generate a page straight into a gzip file; returns the uncompressed size in bytes."""
+    import gzip
+
+    size = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for piece in iter_orders_page(rows, layout_tables, **options):
+            size += len(piece.encode("utf-8"))
+            f.write(piece)
+    return size
+
+
+def git_revision() -> Tuple[str, bool]:
+    """(short commit, working tree dirty) of the scraper checkout, or ("unknown", False)."""
+    here = os.path.dirname(SCRIPT)
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return rev, bool(dirty)
+
+
+def run_scraper(site: StandInSite, tmp: str, formats: str, extra: List[str]) -> dict:
+    """One end-to-end scraper run in a fresh process (so peak RSS is this run's alone)."""
+    out = os.path.join(tmp, "out")
+    shutil.rmtree(out, ignore_errors=True)
+    os.makedirs(out)
+    metrics = os.path.join(tmp, "metrics.jsonl")
+    if os.path.exists(metrics):
+        os.remove(metrics)
+    cmd = [
+        sys.executable, SCRIPT,
+        "--base-url", site.url + "/", "--login-url", site.url + "/index.php",
+        "--orders-url", site.url + "/orders.php", "--email", "bench@example.com", "--password", "bench",
+        "--no-session-cache", "--no-selector-cache", "--formats", formats,
+        "--out-csv", os.path.join(out, "orders.csv"), "--out-xlsx", os.path.join(out, "orders.xlsx"),
+        "--db-file", os.path.join(out, "orders.db"), "--out-parquet", os.path.join(out, "orders.parquet"),
+        "--out-jsonl", os.path.join(out, "orders.jsonl"), "--metrics", metrics, *extra,
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=tmp)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        raise SystemExit(f"Scraper run failed:\n{proc.stdout}{proc.stderr}")
+    with open(metrics, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    run = next(line for line in lines if line["type"] == "run")
+    return {
+        "wall_s": wall,
+        "peak_rss_bytes": run["peak_rss_bytes"],
+        "bytes_downloaded": run["bytes_downloaded"],
+        "rows_parsed": run["rows_parsed"],
+        "output_bytes": {name: os.path.getsize(os.path.join(out, name)) for name in sorted(os.listdir(out))},
+        "stages": {line["stage"]: {k: line[k] for k in ("calls", "wall_s", "cpu_s")}
+                   for line in lines if line["type"] == "stage"},
+    }
+
+
+def load_results(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+CASE_KEYS = ("scenario", "rows", "layout_tables", "formats", "stream")
+
+
+def baseline_for(history: List[dict], ref: str, commit: str) -> dict:
+    """Latest stored result per case (CASE_KEYS) for commit ``ref`` ("last": the latest other commit)."""
+    if ref == "last":
+        older = [r["commit"] for r in history if r["commit"] != commit]
+        if not older:
+            return {}
+        ref = older[-1]
+    return {tuple(r[k] for k in CASE_KEYS): r for r in history if r["commit"].startswith(ref)}
+
+
+def _mb(n: Optional[float]) -> float:
+    return (n or 0) / 1e6
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    """End-to-end runs against the local stand-in, per-stage breakdown, stored for comparison."""
+    commit, dirty = git_revision()
+    history = load_results(args.results)
+    baseline = baseline_for(history, args.compare, commit) if args.compare else {}
+    if args.compare and not baseline:
+        print(f"[!] No stored results for {args.compare!r} in {args.results}; nothing to compare.")
+    extra = [] if args.stream else ["--no-stream"]
+    records, failures = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        page = os.path.join(tmp, "orders.html.gz")
+        site = StandInSite(page)
+        try:
+            print(f"{'scenario':>9} {'rows':>8} {'page MB':>8} {'wire MB':>8} {'total s':>8} "
+                  f"{'rows/s':>9} {'peak RSS MB':>12} {'output MB':>10}")
+            for scenario in args.scenarios:
+                for rows in args.rows:
+                    page_bytes = write_orders_page(page, rows, args.layout_tables, **SCENARIOS[scenario])
+                    run = min((run_scraper(site, tmp, args.formats, extra) for _ in range(args.repeat)),
+                              key=lambda r: r["wall_s"])
+                    if run["rows_parsed"] != rows:
+                        raise SystemExit(f"{scenario}/{rows}: scraper parsed {run['rows_parsed']} rows")
+                    record = {
+                        "commit": commit, "dirty": dirty, "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": sys.version.split()[0], "scenario": scenario, "rows": rows,
+                        "layout_tables": args.layout_tables, "formats": args.formats, "stream": args.stream,
+                        "page_bytes": page_bytes, **run,
+                    }
+                    records.append(record)
+                    print(f"{scenario:>9} {rows:>8} {_mb(page_bytes):>8.1f} {_mb(run['bytes_downloaded']):>8.1f} "
+                          f"{run['wall_s']:>8.2f} {rows / run['wall_s']:>9.0f} {_mb(run['peak_rss_bytes']):>12.0f} "
+                          f"{_mb(sum(run['output_bytes'].values())):>10.1f}")
+                    if args.stages:
+                        for name, st in sorted(run["stages"].items(), key=lambda kv: -kv[1]["wall_s"]):
+                            rate = rows / st["wall_s"] if st["wall_s"] else float("inf")
+                            print(f"{'':>18} {name:<20} {st['wall_s']:>8.3f} s wall {st['cpu_s']:>8.3f} s cpu "
+                                  f"{rate:>11.0f} rows/s")
+                    base = baseline.get(tuple(record[k] for k in CASE_KEYS))
+                    if base:
+                        failures += compare_run(record, base, args.tolerance)
+        finally:
+            site.close()
+
+    if args.results:
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, sort_keys=True) + "\n" for r in records)
+        print(f"[*] Results for {commit}{'+dirty' if dirty else ''} appended to {args.results}")
+    if failures:
+        raise SystemExit("REGRESSION: " + "; ".join(failures))
+
+
+def compare_run(new: dict, old: dict, tolerance: float) -> List[str]:
+    """Print the change against a stored run; return regressions beyond tolerance."""
+    label = f"{new['scenario']}/{new['rows']}"
+    failures = []
+    checks = [("total s", new["wall_s"], old["wall_s"]),
+              ("peak RSS", new["peak_rss_bytes"] or 0, old["peak_rss_bytes"] or 0),
+              ("output", sum(new["output_bytes"].values()), sum(old["output_bytes"].values()))]
+    checks += [(name, st["wall_s"], old["stages"][name]["wall_s"])
+               for name, st in new["stages"].items() if name in old["stages"]]
+    deltas = []
+    for name, now, then in checks:
+        if not then:
+            continue
+        change = now / then - 1
+        deltas.append(f"{name} {change:+.0%}")
+        # Short stages are too noisy to gate on.
+        if change > tolerance and (name in ("total s", "peak RSS") or then >= 0.05):
+            failures.append(f"{label} {name} {change:+.0%} vs {old['commit']}")
+    print(f"{'':>18} vs {old['commit']}: " + ", ".join(deltas))
+    return failures
+
+
+# ------------------------------- CLI --------------------------------
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="YBSNow Order Scraper benchmarks")
+    sub = p.add_subparsers(dest="bench", required=True)
+
+    sp = sub.add_parser("parse", help="Single-pass lxml extractor vs the read_html selector path")
+    sp.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.set_defaults(func=bench_parse)
+
+    sp = sub.add_parser("parity", help="Single-pass lxml extractor vs read_html on edge-case pages")
+    sp.set_defaults(func=bench_parity)
+
+    sp = sub.add_parser("cdc", help="Upsert/history report untouched orders as unchanged when a neighbour changes")
+    sp.set_defaults(func=bench_cdc)
+
+    sp = sub.add_parser("pool", help="BrowserPool discard, wake-up and close handling with fake browsers")
+    sp.set_defaults(func=bench_pool)
+
+    sp = sub.add_parser("outputs", help="CSV vs typed Parquet: write time, file size, reload time")
+    sp.add_argument("--rows", type=int, default=100000)
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.set_defaults(func=bench_outputs)
+
+    sp = sub.add_parser("clean", help="Legacy vs vectorized, typed _clean_df: time and memory")
+    sp.add_argument("--rows", type=int, default=100000)
+    sp.add_argument("--width", type=int, default=40)
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.set_defaults(func=bench_clean)
+
+    sp = sub.add_parser("startup", help="Cold-start import time via python -X importtime")
+    sp.add_argument("--repeat", type=int, default=5)
+    sp.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    sp.add_argument("--max-ms", type=float, default=0, help="Fail if the module import is slower than this")
+    sp.set_defaults(func=bench_startup)
+
+    sp = sub.add_parser("login", help="Byte-scan sign-in detection vs a BeautifulSoup parse")
+    sp.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    sp.add_argument("--repeat", type=int, default=5)
+    sp.set_defaults(func=bench_login)
+
+    sp = sub.add_parser("score", help="Scored fallback table pick vs read_html on every table")
+    sp.add_argument("--tables", type=int, nargs="+", default=[20, 200, 800], help="Layout tables around the orders table")
+    sp.add_argument("--rows", type=int, default=1000)
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.add_argument("--max-ms", type=float, default=0, help="Fail if a scored pick is slower than this")
+    sp.set_defaults(func=bench_score)
+
+    sp = sub.add_parser("suite", help="End-to-end runs against a local stand-in site, stored for regression comparison")
+    sp.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Order rows per page (up to 1000000)")
+    sp.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+                    help="selector: table#orders; fallback: no known selector; wide: long Status/Workstation text")
+    sp.add_argument("--layout-tables", type=int, default=200, help="Layout/nested tables around the orders table")
+    sp.add_argument("--formats", default="csv,sqlite,parquet", help="Scraper --formats for each run")
+    sp.add_argument("--no-stream", dest="stream", action="store_false",
+                    help="Buffer the page (splits fetch and parse into separate stages)")
+    sp.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    sp.add_argument("--stages", action="store_true", help="Print the per-stage breakdown of each run")
+    sp.add_argument("--results", default="bench_results.jsonl", help="Append results here ('' to skip)")
+    sp.add_argument("--compare", default=None, metavar="COMMIT",
+                    help="Compare with stored results for COMMIT (or 'last': the latest other commit)")
+    sp.add_argument("--tolerance", type=float, default=0.15,
+                    help="--compare: fail when time/memory/output grows by more than this fraction")
+    sp.set_defaults(func=bench_suite)
+
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())